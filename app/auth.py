@@ -1,27 +1,40 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import timedelta, datetime, timezone
-from typing import Annotated
+from typing import Annotated, Optional
 
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
-from sqlmodel import Session
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.cache import TTLCache
 from app.config import settings
-from app.database import get_session
-from app.models import User, get_user
+from app.database import get_async_session
+from app.models import User, get_user_async
 from app.schemas import TokenData
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 
 # OAuth2 scheme for token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Resolved users keyed by username, and decoded token payloads keyed by token
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+token_cache = TTLCache(
+    settings.TOKEN_CACHE_SIZE, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
 
 # Function to hash a password
 def hash_password(password: str) -> str:
@@ -33,12 +46,84 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def authenticate_user(username: str, password: str, session) -> User | bool:
-    user = get_user(username, session)
+# Function to verify a password, returning a new hash if the stored one uses a different cost
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class HashingPool:
+    """
+    Runs bcrypt work on a thread or process pool so it never blocks the event loop.
+
+    Calls beyond `max_pending` in flight are rejected with a 503 instead of
+    queueing without bound behind the workers.
+    """
+
+    def __init__(self, kind: str, workers: int, max_pending: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so importing this module never forks worker processes
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_pool = HashingPool(
+    settings.PASSWORD_HASH_EXECUTOR,
+    settings.PASSWORD_HASH_WORKERS,
+    settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+
+async def hash_password_async(password: str) -> str:
+    return await hashing_pool.run(hash_password, password)
+
+
+async def authenticate_user(username: str, password: str, session) -> User | bool:
+    user = await get_user_async(username, session)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await hashing_pool.run(
+        verify_and_update_password, password, user.hashed_password
+    )
+    if not valid:
         return False
+    if new_hash:
+        # Transparently upgrade hashes created with a different BCRYPT_ROUNDS
+        user.hashed_password = new_hash
+        await session.commit()
+        invalidate_user(user.username)
     return user
 
 
@@ -66,9 +151,46 @@ def create_access_token(data: dict, expires_delta: int | timedelta = None) -> st
     return encoded_jwt
 
 
+def decode_token(token: str) -> dict:
+    """
+    Decode and verify a JWT, reusing the payload of tokens seen before until they expire.
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        exp = payload.get("exp")
+        token_cache.set(token, payload, ttl=exp - time.time() if exp else None)
+    return payload
+
+
+async def get_cached_user(username: str, session: AsyncSession) -> Optional[User]:
+    """
+    Resolve a user through user_cache, falling back to the database on a miss.
+
+    Cached entries are detached copies; they are merged into the request session
+    without a query so handlers get a session-bound object as before.
+    """
+    cached = user_cache.get(username)
+    if cached is not None:
+        return await session.merge(cached, load=False)
+    user = await get_user_async(username, session)
+    if user is not None:
+        copy = User(**{c.key: getattr(user, c.key) for c in User.__table__.columns})
+        make_transient_to_detached(copy)
+        user_cache.set(username, copy)
+    return user
+
+
+def invalidate_user(*usernames: str) -> None:
+    # Only this process's cache; other workers keep their copy for up to
+    # USER_CACHE_TTL_SECONDS
+    for username in usernames:
+        user_cache.pop(username)
+
+
 async def get_current_user(
         token: Annotated[str, Depends(oauth2_scheme)],
-        session: Session = Depends(get_session),
+        session: AsyncSession = Depends(get_async_session),
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -76,14 +198,14 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username = payload.get("sub")
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
     except InvalidTokenError:
         raise credentials_exception
-    user = get_user(token_data.username, session)
+    user = await get_cached_user(token_data.username, session)
     if user is None:
         raise credentials_exception
     return user
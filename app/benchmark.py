@@ -0,0 +1,391 @@
+"""
+Benchmark the API in-process and compare the results against a baseline.
+
+Requests go through httpx's ASGI transport straight into `app.main:app` (with
+its lifespan and full middleware stack), over a SQLite database seeded by
+app.generate_data. Each scenario reports throughput and latency percentiles;
+the figures include client overhead, so compare them only with runs on the
+same machine.
+
+With --layers it instead measures the latency each middleware layer adds to
+a request: the same trivial endpoint on a bare app, behind each layer alone
+and behind all of them, called sequentially.
+
+Usage:
+    python -m app.benchmark --save-baseline bench.json
+    python -m app.benchmark --baseline bench.json --tolerance 0.2
+    python -m app.benchmark --layers
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+# Share of each operation in the "mixed" scenario
+MIXED_WEIGHTS = {
+    "get_post": 70,
+    "list_posts": 15,
+    "create_post": 5,
+    "update_post": 7,
+    "delete_post": 3,
+}
+# Metrics compared against the baseline, and whether higher is better
+COMPARED_METRICS = {"throughput": True, "p50_ms": False, "p95_ms": False}
+
+
+class Context:
+    """
+    State shared by the benchmark workers: tokens and known post ids.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, seed: int):
+        self.client = client
+        self.rnd = random.Random(seed)
+        self.username = ""
+        self.password = ""
+        self.headers: Dict[str, str] = {}
+        self.post_ids: List[int] = []
+        self.created_ids: List[int] = []
+
+
+async def login(ctx: Context) -> httpx.Response:
+    return await ctx.client.post(
+        "/token", data={"username": ctx.username, "password": ctx.password}
+    )
+
+
+async def get_post(ctx: Context) -> httpx.Response:
+    post_id = ctx.rnd.choice(ctx.post_ids)
+    return await ctx.client.get(f"/posts/{post_id}", headers=ctx.headers)
+
+
+async def list_posts(ctx: Context) -> httpx.Response:
+    return await ctx.client.get("/posts/list_posts?limit=20", headers=ctx.headers)
+
+
+async def create_post(ctx: Context) -> httpx.Response:
+    response = await ctx.client.post(
+        "/posts/",
+        json={"title": "Benchmark post", "content": "lorem ipsum " * 100},
+        headers=ctx.headers,
+    )
+    if response.status_code == 201:
+        ctx.created_ids.append(response.json()["id"])
+    return response
+
+
+async def update_post(ctx: Context) -> httpx.Response:
+    post_id = ctx.rnd.choice(ctx.created_ids or ctx.post_ids)
+    return await ctx.client.put(
+        f"/posts/{post_id}", json={"title": "Updated title"}, headers=ctx.headers
+    )
+
+
+async def delete_post(ctx: Context) -> httpx.Response:
+    if not ctx.created_ids:
+        # Never delete seeded posts, other operations read them
+        return await create_post(ctx)
+    post_id = ctx.created_ids.pop(ctx.rnd.randrange(len(ctx.created_ids)))
+    return await ctx.client.delete(f"/posts/{post_id}", headers=ctx.headers)
+
+
+async def mixed(ctx: Context) -> httpx.Response:
+    (name,) = ctx.rnd.choices(list(MIXED_WEIGHTS), list(MIXED_WEIGHTS.values()))
+    return await OPERATIONS[name](ctx)
+
+
+OPERATIONS: Dict[str, Callable[[Context], Awaitable[httpx.Response]]] = {
+    "login": login,
+    "get_post": get_post,
+    "list_posts": list_posts,
+    "create_post": create_post,
+    "update_post": update_post,
+    "delete_post": delete_post,
+    "mixed": mixed,
+}
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+
+async def run_scenario(ctx: Context, name: str, requests: int, concurrency: int):
+    """
+    Issue `requests` calls of scenario `name` from `concurrency` concurrent
+    workers and summarize their latencies. Non-2xx responses count as errors.
+    """
+    operation = OPERATIONS[name]
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await operation(ctx)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 300:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def middleware_layers() -> Dict[str, list]:
+    """
+    (middleware class, options) of each layer measured by --layers, configured
+    as app.main configures them but with a limit that is never reached.
+    """
+    from app.compression import available_encoders
+    from app.config import settings
+    from app.middleware import (
+        CompressionMiddleware,
+        LoggingMiddleware,
+        MetricsMiddleware,
+        RateLimitingMiddleware,
+        TimingMiddleware,
+    )
+
+    return {
+        "compression": [
+            (
+                CompressionMiddleware,
+                {
+                    "encoders": available_encoders(settings.COMPRESSION_ENCODINGS),
+                    "minimum_size": settings.COMPRESSION_MIN_SIZE,
+                },
+            )
+        ],
+        "timing": [(TimingMiddleware, {"db_stats_headers": True})],
+        "metrics": [(MetricsMiddleware, {})],
+        "logging": [(LoggingMiddleware, {"success_sample_rate": 1.0})],
+        "ratelimit": [
+            (RateLimitingMiddleware, {"max_requests": 10**9, "window_seconds": 60})
+        ],
+    }
+
+
+async def ok() -> dict:
+    return {"status": "ok"}
+
+
+async def benchmark_layers(args) -> dict:
+    """
+    Time `args.requests` sequential GETs of a trivial endpoint on a bare app,
+    behind each middleware layer and behind all of them, and report the mean
+    latency each adds over the bare app.
+
+    Access log lines are formatted and queued as in production, then dropped.
+    """
+    from fastapi import FastAPI
+
+    from app.logging_config import JSONFormatter
+
+    log_queue = SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(JSONFormatter())
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(logging.INFO)
+    listener = QueueListener(log_queue, logging.NullHandler())
+    listener.start()
+
+    layers = middleware_layers()
+    stacks = {"bare": [], **layers}
+    stacks["all"] = [layer for stack in layers.values() for layer in stack]
+
+    results = {}
+    try:
+        for name, stack in stacks.items():
+            app = FastAPI()
+            app.get("/")(ok)
+            for middleware, options in stack:
+                app.add_middleware(middleware, **options)
+
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+            ) as client:
+                for _ in range(args.warmup):
+                    await client.get("/")
+                latencies: List[float] = []
+                errors = 0
+                start = time.perf_counter()
+                for _ in range(args.requests):
+                    request_start = time.perf_counter()
+                    response = await client.get("/")
+                    latencies.append(time.perf_counter() - request_start)
+                    errors += response.status_code >= 300
+                results[name] = summarize(
+                    latencies, errors, time.perf_counter() - start
+                )
+
+            added_us = (results[name]["mean_ms"] - results["bare"]["mean_ms"]) * 1000
+            print(f"{format_row(name, results[name])}  {added_us:+.0f} us/req")
+    finally:
+        listener.stop()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    List the metrics of `results` that are worse than `baseline` by more than
+    `tolerance` (a fraction).
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous[metric], current[metric]
+            if higher_is_better:
+                worse = new < old * (1 - tolerance)
+            else:
+                worse = new > old * (1 + tolerance)
+            if worse:
+                regressions.append(f"{name}.{metric}: {old} -> {new}")
+    return regressions
+
+
+async def benchmark(args) -> dict:
+    from app.generate_data import generate, parse_args
+    from app.main import app
+
+    print("Seeding the database...")
+    generator = generate(
+        parse_args(
+            ["--database", os.environ["DATABASE_URL"]]
+            + ["--users", str(args.users), "--seed", str(args.seed)]
+            + ["--password", "benchmark", "--comments-per-post", "2"]
+        )
+    )
+    admin = f"user{generator.user_ids[0]}"
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            ctx = Context(client, args.seed)
+            ctx.username, ctx.password = admin, "benchmark"
+            token = (await login(ctx)).json()["access_token"]
+            ctx.headers = {"Authorization": f"Bearer {token}"}
+            ctx.post_ids = list(generator.post_ids)
+
+            for name in args.scenarios:
+                requests = args.requests
+                if name == "login":
+                    # bcrypt bounds this scenario; keep it short
+                    requests = max(args.requests // 10, args.concurrency)
+                if args.warmup:
+                    await run_scenario(ctx, name, args.warmup, args.concurrency)
+                results[name] = await run_scenario(
+                    ctx, name, requests, args.concurrency
+                )
+                print(format_row(name, results[name]))
+    return results
+
+
+def format_row(name: str, result: dict) -> str:
+    return (
+        f"{name:<12} {result['requests']:>7} req {result['errors']:>4} err "
+        f"{result['throughput']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f} ms  "
+        f"p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(OPERATIONS),
+        default=list(OPERATIONS),
+    )
+    parser.add_argument("--requests", type=int, default=2000, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=100, help="per scenario")
+    parser.add_argument("--users", type=int, default=200, help="seeded users")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--database", help="SQLite file to use (default: a temporary file)"
+    )
+    parser.add_argument("--baseline", help="fail if worse than this JSON baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed relative regression against the baseline",
+    )
+    parser.add_argument("--save-baseline", help="write the results to this file")
+    parser.add_argument(
+        "--layers",
+        action="store_true",
+        help="measure the latency added by each middleware layer instead",
+    )
+    args = parser.parse_args()
+
+    # Settings are read at import, so configure the app before importing it
+    database = args.database or os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ.setdefault("ECHO", "False")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("RATE_LIMIT_MAX_REQUESTS", str(10**9))
+
+    results = asyncio.run(benchmark_layers(args) if args.layers else benchmark(args))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "requests": args.requests,
+                    "concurrency": args.concurrency,
+                    "scenarios": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["scenarios"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
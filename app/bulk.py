@@ -0,0 +1,166 @@
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import DBAPIError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.database import async_engine
+
+# (line number, column values) of one parsed import row
+ImportRow = Tuple[int, dict]
+
+# Errors caused by the values of a row: DBAPIError covers constraint
+# violations and out-of-range data; sqlite3 raises a bare OverflowError for
+# integers beyond 64 bits
+_ROW_ERRORS = (DBAPIError, OverflowError)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+async def export_ndjson(table) -> AsyncIterator[bytes]:
+    """
+    Stream every row of `table` as NDJSON, in primary key order.
+
+    Rows come from a server-side cursor in batches of BULK_BATCH_SIZE, so
+    memory use does not grow with the table. The stream runs on its own
+    connection because request-scoped sessions are closed before a streaming
+    body is sent.
+    """
+    statement = (
+        select(table)
+        .order_by(*table.primary_key.columns)
+        .execution_options(yield_per=settings.BULK_BATCH_SIZE)
+    )
+    async with async_engine.connect() as conn:
+        result = await conn.stream(statement)
+        async for rows in result.mappings().partitions():
+            yield "".join(
+                json.dumps(dict(row), default=_json_default) + "\n" for row in rows
+            ).encode()
+
+
+async def _read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Split a byte stream into numbered lines (1-based), skipping blank ones.
+    """
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in e['loc']) or 'line'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+async def _insert_batch(
+    db: AsyncSession, table, batch: List[ImportRow], errors: List[dict]
+) -> int:
+    """
+    Insert a batch with one executemany per set of supplied columns (rows with
+    and without explicit ids, say); if the database rejects it (a constraint,
+    a value out of range...), retry it row by row so only the offending rows
+    are rejected.
+    """
+    groups = defaultdict(list)
+    for _, values in batch:
+        groups[frozenset(values)].append(values)
+    try:
+        for rows in groups.values():
+            await db.exec(insert(table), params=rows)
+        await db.commit()
+        return len(batch)
+    except _ROW_ERRORS:
+        await db.rollback()
+
+    inserted = 0
+    for line_no, values in batch:
+        try:
+            await db.exec(insert(table), params=[values])
+            await db.commit()
+            inserted += 1
+        except _ROW_ERRORS as e:
+            await db.rollback()
+            message = str(e.orig) if isinstance(e, DBAPIError) else str(e)
+            errors.append({"line": line_no, "error": message})
+    return inserted
+
+
+async def import_ndjson(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    schema: Type[BaseModel],
+    table,
+    prepare: Optional[
+        Callable[
+            [AsyncSession, List[ImportRow], List[dict]], Awaitable[List[ImportRow]]
+        ]
+    ] = None,
+) -> dict:
+    """
+    Insert NDJSON rows validated against `schema` into `table`, in batches of
+    BULK_BATCH_SIZE, each committed on its own.
+
+    Rows that fail to parse, validate, `prepare` or insert are reported by line
+    number and skipped; the rest of the import carries on.
+    """
+    inserted = 0
+    errors: List[dict] = []
+    batch: List[ImportRow] = []
+
+    async def flush():
+        nonlocal inserted, batch
+        rows = await prepare(db, batch, errors) if prepare else batch
+        if rows:
+            inserted += await _insert_batch(db, table, rows, errors)
+        batch = []
+
+    async for line_no, line in _read_lines(chunks):
+        try:
+            item = schema.model_validate_json(line)
+        except ValidationError as e:
+            errors.append({"line": line_no, "error": _describe(e)})
+            continue
+        values = item.model_dump(exclude_none=True)
+        if "created_at" in table.c:
+            values.setdefault("created_at", datetime.now(timezone.utc))
+            values.setdefault("updated_at", values["created_at"])
+        batch.append((line_no, values))
+        if len(batch) >= settings.BULK_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+
+    if inserted and db.get_bind().dialect.name == "postgresql":
+        # Rows imported with explicit ids do not advance the id sequence
+        await db.exec(
+            select(
+                func.setval(
+                    func.pg_get_serial_sequence(table.name, "id"),
+                    select(func.coalesce(func.max(table.c.id), 1)).scalar_subquery(),
+                )
+            )
+        )
+        await db.commit()
+
+    errors.sort(key=lambda e: e["line"])
+    return {"inserted": inserted, "errors": errors}
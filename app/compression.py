@@ -0,0 +1,120 @@
+import zlib
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # Optional: pip install zstandard
+    zstandard = None
+
+# Content types worth compressing; everything else (images, archives...) is
+# usually compressed already
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+class Encoder(ABC):
+    """
+    Incremental compressor: feed chunks to `compress`, call `flush` to emit
+    everything fed so far (for streaming), and `finish` once at the end.
+    """
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes: ...
+
+    @abstractmethod
+    def flush(self) -> bytes: ...
+
+    @abstractmethod
+    def finish(self) -> bytes: ...
+
+
+class GzipEncoder(Encoder):
+    def __init__(self, level: int):
+        # wbits=31: zlib stream with a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder(Encoder):
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder(Encoder):
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_encoders(levels: Dict[str, int]) -> Dict[str, Callable[[], Encoder]]:
+    """
+    Encoder factories, by Content-Encoding token, for the encodings in
+    `levels` whose library is installed.
+    """
+    classes = {"gzip": GzipEncoder}
+    if brotli is not None:
+        classes["br"] = BrotliEncoder
+    if zstandard is not None:
+        classes["zstd"] = ZstdEncoder
+    return {
+        name: (lambda cls=classes[name], level=level: cls(level))
+        for name, level in levels.items()
+        if name in classes
+    }
+
+
+def choose_encoding(accept_encoding: str, preference: List[str]) -> Optional[str]:
+    """
+    The first encoding of `preference` that the Accept-Encoding header allows
+    (q > 0, directly or through `*`), or None for an uncompressed response.
+    """
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    for name in preference:
+        if weights.get(name, weights.get("*", 0.0)) > 0:
+            return name
+    return None
@@ -0,0 +1,63 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Optional
+
+from fastapi import Response, status
+
+# Responses are per-user, so shared caches must not store them, and clients
+# must revalidate before reusing a stored copy
+CACHE_CONTROL = "private, no-cache"
+
+
+def _normalize(part) -> str:
+    # The same instant must hash identically whether it came from the database
+    # (naive UTC) or was just assigned in a handler (aware UTC)
+    if isinstance(part, datetime) and part.tzinfo is not None:
+        part = part.astimezone(timezone.utc).replace(tzinfo=None)
+    return part.isoformat() if isinstance(part, datetime) else str(part)
+
+
+def make_etag(*parts, weak: bool = False) -> str:
+    """
+    Build an ETag from the values that version a resource.
+
+    Use `weak` when some fields (e.g. buffered counters) can change without
+    changing `parts`, so equal tags only promise an equivalent representation.
+    """
+    digest = hashlib.sha1("|".join(_normalize(p) for p in parts).encode())
+    return f'{"W/" if weak else ""}"{digest.hexdigest()}"'
+
+
+def _opaque_tag(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Evaluate an If-None-Match header (weak comparison, as RFC 9110 requires).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (_opaque_tag(tag.strip()) for tag in if_none_match.split(","))
+    return _opaque_tag(etag) in candidates
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers=cache_headers(etag, last_modified),
+    )
@@ -1,3 +1,5 @@
+from typing import Dict, List, Literal, Tuple
+
 from pydantic_settings import BaseSettings
 
 
@@ -9,11 +11,123 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your_secret_key"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    USER_CACHE_SIZE: int = 1024
+    # The cache is per process and invalidate_user only clears the worker that
+    # handled the change, so with several workers a role change, ban or
+    # deletion can take up to this long to apply everywhere
+    USER_CACHE_TTL_SECONDS: int = 60
+    TOKEN_CACHE_SIZE: int = 4096
+
+    # Password hashing (bcrypt runs in a bounded worker pool off the event loop)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
+    # Startup
+    # Run metadata.create_all on boot; turn off where migrations own the schema
+    CREATE_TABLES_ON_STARTUP: bool = True
+    # Open pools and prime statement caches before /readyz reports ready
+    WARMUP_ON_STARTUP: bool = True
+
+    # SQLite
+    # Pragmas applied to every SQLite connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    # Negative values are KiB, as in PRAGMA cache_size
+    SQLITE_CACHE_SIZE: int = -64000
+    # Queue writes on one connection instead of letting writers fight for the lock
+    SQLITE_SERIALIZE_WRITES: bool = True
+
+    # Read replicas
+    # Replica URLs for read-only handlers (JSON list in the environment)
+    READ_REPLICA_URLS: List[str] = []
+    # How long a replica that failed to connect is skipped
+    REPLICA_EJECT_SECONDS: float = 30
+    # How long a client's reads stay on the primary after it writes
+    REPLICA_STICKY_SECONDS: float = 5
+
+    # Pagination
+    DEFAULT_PAGE_SIZE: int = 20
+    MAX_PAGE_SIZE: int = 100
+
+    # Rate limiting
+    RATE_LIMIT_MAX_REQUESTS: int = 100
+    RATE_LIMIT_WINDOW_SECONDS: int = 60
+    RATE_LIMIT_KEY: Literal["ip", "user"] = "ip"
+    # Per-route overrides, e.g. {"/token": [10, 60]} (JSON in the environment)
+    RATE_LIMIT_ROUTES: Dict[str, Tuple[int, int]] = {}
+    # "memory" is per process; "sqlite" and "redis" share counters across workers
+    RATE_LIMIT_BACKEND: Literal["memory", "sqlite", "redis"] = "memory"
+    # SQLite file path or Redis URL for the shared backends
+    RATE_LIMIT_URL: str = ""
+    # Health probes and metrics scrapes: never rate limited nor access logged
+    UNMETERED_PATHS: List[str] = ["/healthz", "/readyz", "/metrics"]
+
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    # Fraction of 2xx/3xx access log lines kept; errors are always logged
+    LOG_SUCCESS_SAMPLE_RATE: float = 1.0
+
+    # SQL instrumentation
+    # Add X-DB-Queries / X-DB-Time (ms) headers with per-request statement stats
+    DB_STATS_HEADERS: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+    SLOW_QUERY_EXPLAIN: bool = True
+
+    # Bulk export / import
+    # Rows fetched per server-side cursor batch, and rows per import transaction
+    BULK_BATCH_SIZE: int = 1000
+
+    # Counters
+    # View/like/comment counts are buffered in memory and written in batches
+    COUNTER_FLUSH_INTERVAL_SECONDS: float = 5
+    # Flush early once this many distinct rows have pending increments
+    COUNTER_FLUSH_MAX_KEYS: int = 10000
+
+    # Feed
+    # Posts kept per feed (featured, trending, latest)
+    FEED_SIZE: int = 1000
+    # Only posts this recent can trend
+    FEED_TRENDING_WINDOW_DAYS: float = 7
+    # Time-decay exponent of the trending score: points / (age_hours + 2) ** gravity
+    FEED_GRAVITY: float = 1.8
+    # Pick up new and changed posts, and re-rank, this often
+    FEED_REFRESH_SECONDS: float = 10
+    # Reload every feed from the database this often (catches other workers' counts)
+    FEED_REBUILD_SECONDS: float = 600
+
+    # Compression
+    # Response encodings and their levels, in order of preference (JSON in the
+    # environment); br and zstd are used only if brotli / zstandard are installed
+    COMPRESSION_ENCODINGS: Dict[str, int] = {"zstd": 3, "br": 4, "gzip": 4}
+    # Smaller bodies are sent uncompressed
+    COMPRESSION_MIN_SIZE: int = 1024
+
+    # Server (python -m app.server)
+    HOST: str = "127.0.0.1"
+    PORT: int = 8000
+    # Worker processes; 0 means one per available CPU
+    WORKERS: int = 0
+    SERVER_LOOP: Literal["uvloop", "asyncio", "auto"] = "uvloop"
+    SERVER_HTTP: Literal["httptools", "h11", "auto"] = "httptools"
+    # Restart a worker after this many requests (0: never), plus up to JITTER
+    # more so workers do not all restart at once
+    MAX_REQUESTS: int = 0
+    MAX_REQUESTS_JITTER: int = 0
+    # On SIGTERM, keep serving with /readyz failing for this long, then wait up
+    # to GRACEFUL_TIMEOUT_SECONDS for in-flight requests
+    SHUTDOWN_DRAIN_SECONDS: float = 5
+    GRACEFUL_TIMEOUT_SECONDS: int = 20
+    # Restart on code changes when run with python -m app.main (development)
+    RELOAD: bool = False
 
     # Application settings
 
-    ECHO: bool = True
-    RELOAD: bool = True
+    # Log every SQL statement (routed through the logging queue)
+    ECHO: bool = False
 
     class Config:
         env_file = ".env"
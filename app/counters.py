@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+
+from app.config import settings
+from app.database import write_engine
+
+logger = logging.getLogger(__name__)
+
+# (model, column, row id) -> pending increment
+CounterDeltas = Dict[Tuple[type, str, int], int]
+
+
+class CounterBuffer:
+    """
+    Write-behind buffer for counter columns such as Post.view_count.
+
+    Increments are summed in memory per (model, column, row id) and flushed
+    periodically as one batched `UPDATE ... SET col = col + :n` per column, so
+    a hot row costs one write per flush instead of one transaction per hit.
+    Counts buffered since the last flush are lost if the process crashes.
+
+    `listeners` are called with the deltas of every successful flush.
+    """
+
+    def __init__(self, engine, interval: float, max_keys: int):
+        self.engine = engine
+        self.interval = interval
+        self.max_keys = max_keys
+        self._pending: CounterDeltas = defaultdict(int)
+        self.listeners: List[Callable[[CounterDeltas], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Future] = None
+        self._wakeup = asyncio.Event()
+
+    def incr(self, model: type, column: str, row_id: int, amount: int = 1) -> None:
+        self._pending[(model, column, row_id)] += amount
+        if len(self._pending) >= self.max_keys:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        # Swap first so increments made while we await go into a fresh buffer
+        pending, self._pending = self._pending, defaultdict(int)
+
+        batches = defaultdict(list)
+        for (model, column, row_id), amount in pending.items():
+            if amount:
+                batches[(model, column)].append({"row_id": row_id, "amount": amount})
+        try:
+            async with self.engine.begin() as conn:
+                for (model, column), params in batches.items():
+                    col = getattr(model, column)
+                    statement = (
+                        update(model)
+                        .where(model.id == bindparam("row_id"))
+                        .values({column: col + bindparam("amount")})
+                    )
+                    await conn.execute(statement, params)
+        except Exception:
+            logger.exception("Counter flush failed, keeping %d deltas", len(pending))
+            for key, amount in pending.items():
+                self._pending[key] += amount
+            return
+        for listener in self.listeners:
+            listener(pending)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Shielded so that stop() cannot cancel a flush halfway and drop the
+            # deltas it swapped out; stop() waits for it instead
+            self._flushing = asyncio.ensure_future(self.flush())
+            await asyncio.shield(self._flushing)
+
+    def start(self) -> None:
+        # The event must belong to the running loop, so create it here
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+        await self.flush()
+
+
+counter_buffer = CounterBuffer(
+    write_engine,
+    settings.COUNTER_FLUSH_INTERVAL_SECONDS,
+    settings.COUNTER_FLUSH_MAX_KEYS,
+)
@@ -1,42 +1,320 @@
-from typing import Generator
+import logging
+import time
+from typing import AsyncGenerator, Generator, List, Optional
 
+from fastapi import Request
+from sqlalchemy import Delete, Engine, Insert, Update, event, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.cache import TTLCache
 from app.config import settings
+from app.metrics import register_pool, timed_pool_class
+from app.query_stats import instrument_engine
 
-# Get database URL from settings
-db_url = settings.DATABASE_URL
+logger = logging.getLogger(__name__)
+
+
+def normalize_url(url: str) -> str:
+    # Handle the postgres:// to postgresql:// conversion needed for some services like Render
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
 
-# Handle the postgres:// to postgresql:// conversion needed for some services like Render
-if db_url.startswith("postgres://"):
-    db_url = db_url.replace("postgres://", "postgresql://", 1)
+
+# Get database URL from settings
+db_url = normalize_url(settings.DATABASE_URL)
 
 # Set connection arguments based on database type
 connect_args = {}
 if db_url.startswith("sqlite"):
     connect_args = {"check_same_thread": False}  # Only needed for SQLite
 
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in (
+        f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout = {settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size = {settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size = {settings.SQLITE_CACHE_SIZE}",
+    ):
+        cursor.execute(pragma)
+    cursor.close()
+
+
 # Create engine with appropriate settings
 engine = create_engine(
     db_url,
-    echo=settings.ECHO,
     connect_args=connect_args,
+    poolclass=timed_pool_class(QueuePool, "sync"),
     # Optional PostgreSQL-specific settings (uncomment if needed)
     pool_size=5,
     max_overflow=10,
     pool_timeout=30,
     pool_recycle=1800,
 )
+if db_url.startswith("sqlite"):
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+
+
+def get_async_url(url: str) -> str:
+    """
+    Map a synchronous database URL onto its asyncio driver
+    (aiosqlite for SQLite, asyncpg for PostgreSQL).
+    """
+    scheme, sep, rest = url.partition("://")
+    driver = scheme.split("+", 1)[0]
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if driver == "postgresql":
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+def create_async_engine_for(url: str, pool_name: str, **pool_options) -> AsyncEngine:
+    """
+    Create an instrumented async engine for `url`, reporting its pool metrics
+    as `pool_name`. `pool_options` override the default pool sizing.
+    """
+    async_url = get_async_url(normalize_url(url))
+    is_sqlite = async_url.startswith("sqlite")
+    new_engine = create_async_engine(
+        async_url,
+        connect_args={"check_same_thread": False} if is_sqlite else {},
+        poolclass=timed_pool_class(AsyncAdaptedQueuePool, pool_name),
+        **{
+            "pool_size": 5,
+            "max_overflow": 10,
+            "pool_timeout": 30,
+            "pool_recycle": 1800,
+            **pool_options,
+        },
+    )
+    if is_sqlite:
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    instrument_engine(new_engine.sync_engine)
+    register_pool(pool_name, lambda: new_engine.sync_engine.pool)
+    return new_engine
+
+
+# Async engine used by the request handlers so SQL round trips don't block the event loop
+async_engine = create_async_engine_for(db_url, "async")
 
+instrument_engine(engine)
+register_pool("sync", lambda: engine.pool)
+
+
+def _begin_immediate(sqlite_engine: AsyncEngine) -> None:
+    """
+    Make transactions on `sqlite_engine` take the write lock up front, where
+    busy_timeout applies, instead of failing to upgrade a read lock later.
+    """
+
+    @event.listens_for(sqlite_engine.sync_engine, "connect")
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself (see the "begin" listener)
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(sqlite_engine.sync_engine, "begin")
+    def begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+if db_url.startswith("sqlite") and settings.SQLITE_SERIALIZE_WRITES:
+    # SQLite allows one writer at a time: queue this process's writers on a
+    # single connection instead of having them poll the database lock
+    write_engine = create_async_engine_for(db_url, "write", pool_size=1, max_overflow=0)
+    _begin_immediate(write_engine)
+else:
+    write_engine = async_engine
+
+
+class WriteRoutingSession(Session):
+    """
+    Session that runs flushes and INSERT/UPDATE/DELETE statements on
+    write_engine and everything else on async_engine, so a request holds the
+    single SQLite writer only between its first write and its commit.
+
+    Reads use their own connection, so they do not see this session's
+    uncommitted writes: commit before querying what was just written.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            return write_engine.sync_engine
+        return async_engine.sync_engine
+
+
+class ReplicaSet:
+    """
+    Round-robin over read replica engines, skipping for REPLICA_EJECT_SECONDS
+    any replica whose connection failed or dropped.
+    """
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    def __init__(self, engines: List[AsyncEngine], eject_seconds: float):
+        self.engines = engines
+        self.eject_seconds = eject_seconds
+        self._ejected_until = [0.0] * len(engines)
+        self._next = 0
+        for replica in engines:
+            event.listen(replica.sync_engine, "handle_error", self._watch(replica))
+
+    def _watch(self, replica: AsyncEngine):
+        def handle_error(context):
+            # No connection means the failure happened while connecting
+            if context.is_disconnect or context.connection is None:
+                self.eject(replica)
+
+        return handle_error
+
+    def eject(self, replica: AsyncEngine) -> None:
+        index = self.engines.index(replica)
+        now = time.monotonic()
+        if self._ejected_until[index] <= now:
+            logger.warning(
+                "Ejecting read replica %d for %.0fs", index, self.eject_seconds
+            )
+        self._ejected_until[index] = now + self.eject_seconds
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """
+        The next healthy replica, or None if there is none.
+        """
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            index = self._next % len(self.engines)
+            self._next += 1
+            if self._ejected_until[index] <= now:
+                return self.engines[index]
+        return None
+
+
+replicas = ReplicaSet(
+    [
+        create_async_engine_for(url, f"replica{index}")
+        for index, url in enumerate(settings.READ_REPLICA_URLS)
+    ],
+    settings.REPLICA_EJECT_SECONDS,
+)
+
+# Clients that wrote recently; their reads stay on the primary so they see
+# their own writes despite replication lag
+recent_writers = TTLCache(maxsize=10000, ttl=settings.REPLICA_STICKY_SECONDS)
+
+
+def _client_key(request: Request) -> str:
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return authorization
+    return request.client.host if request.client else ""
+
+
+# Columns added to existing tables after their first release, which create_all
+# does not add: (table, column, column DDL, statement backfilling it)
+_ADDED_COLUMNS = [
+    (
+        "post",
+        "comment_count",
+        "INTEGER DEFAULT 0",
+        "UPDATE post SET comment_count = "
+        "(SELECT count(*) FROM comment WHERE comment.post_id = post.id)",
+    ),
+]
+
+
+def _add_missing_columns(conn) -> None:
+    """
+    Add and backfill the columns of _ADDED_COLUMNS that a database created
+    by an older version lacks. Safe to run on every startup.
+    """
+    inspector = inspect(conn)
+    for table, column, ddl, backfill in _ADDED_COLUMNS:
+        if column in {c["name"] for c in inspector.get_columns(table)}:
+            continue
+        logger.info("Adding column %s.%s", table, column)
+        # IF NOT EXISTS guards against another process migrating concurrently;
+        # SQLite does not support it
+        guard = "IF NOT EXISTS " if conn.dialect.name == "postgresql" else ""
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {guard}{column} {ddl}"))
+        conn.execute(text(backfill))
+
+
+def _create_missing_indexes(conn) -> None:
+    """
+    Create the indexes declared on the models that an existing table lacks;
+    create_all only creates indexes along with a new table.
+    """
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def create_db_and_tables(bind: Optional[Engine] = None):
+    # Imported here because app.search depends on app.models, which imports this module
+    from app.search import create_search_index
+
+    bind = bind or engine
+    SQLModel.metadata.create_all(bind)
+    with bind.begin() as conn:
+        _add_missing_columns(conn)
+        _create_missing_indexes(conn)
+        create_search_index(conn)
 
 
 def get_session() -> Generator[Session, None, None]:
     """
     Creates a new session for each request and closes it after the request is processed.
     """
-    print("Creating a new session")
+    logger.debug("Creating a new session")
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Creates a new async session for each request and closes it after the request is processed.
+
+    Objects are not expired on commit, since attribute access after a commit would
+    otherwise trigger an implicit (and, under asyncio, forbidden) refresh query.
+
+    Writes go through write_engine (see WriteRoutingSession) when it is separate.
+    """
+    if replicas.engines and request.method not in ("GET", "HEAD", "OPTIONS"):
+        recent_writers.set(_client_key(request), True)
+    if write_engine is async_engine:
+        session = AsyncSession(async_engine, expire_on_commit=False)
+    else:
+        session = AsyncSession(
+            sync_session_class=WriteRoutingSession, expire_on_commit=False
+        )
+    async with session:
+        yield session
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for read-only handlers: served by a healthy read replica when any
+    are configured, otherwise (or right after this client wrote) by the primary.
+
+    The replica connection is opened up front, so a replica that cannot be
+    reached is ejected and the next one (or the primary) serves this request.
+    """
+    if replicas.engines and recent_writers.get(_client_key(request)) is None:
+        while (replica := replicas.choose()) is not None:
+            session = AsyncSession(replica, expire_on_commit=False)
+            try:
+                await session.connection()
+            except (DBAPIError, OSError):
+                await session.close()
+                replicas.eject(replica)
+                continue
+            async with session:
+                yield session
+            return
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
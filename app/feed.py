@@ -0,0 +1,255 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Literal, NamedTuple, Optional, Set, Tuple, get_args
+
+from sqlalchemy import or_, select
+
+from app.config import settings
+from app.counters import CounterDeltas, counter_buffer
+from app.database import async_engine
+from app.models import Post
+
+logger = logging.getLogger(__name__)
+
+FeedKind = Literal["featured", "trending", "latest"]
+# Points a post earns per like, comment and view, before time decay
+LIKE_POINTS = 1.0
+COMMENT_POINTS = 2.0
+VIEW_POINTS = 0.05
+# Counter columns that feed the trending score
+TRENDING_COUNTERS = ("likes_count", "comment_count", "view_count")
+
+# Sort key of a post within a feed, ascending: (rank, id)
+FeedKey = Tuple[float, int]
+
+_COLUMNS = (
+    Post.id,
+    Post.created_at,
+    Post.is_featured,
+    Post.likes_count,
+    Post.comment_count,
+    Post.view_count,
+)
+
+
+class _Entry(NamedTuple):
+    created_at: float  # POSIX timestamp
+    is_featured: bool
+    likes_count: int
+    comment_count: int
+    view_count: int
+
+
+def _timestamp(value: datetime) -> float:
+    # Naive datetimes are stored in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def trending_score(entry: _Entry, now: float) -> float:
+    """
+    Engagement points decayed by age, as in Hacker News' ranking: a post needs
+    ever more points to stay up as it gets older.
+    """
+    points = (
+        LIKE_POINTS * entry.likes_count
+        + COMMENT_POINTS * entry.comment_count
+        + VIEW_POINTS * entry.view_count
+    )
+    age_hours = max(now - entry.created_at, 0) / 3600
+    return points / (age_hours + 2) ** settings.FEED_GRAVITY
+
+
+class FeedRanking:
+    """
+    Precomputed order of the featured, trending and latest feeds, so a feed
+    page is a slice of a sorted list plus one query for the posts on it.
+
+    The candidate posts (the newest `size`, the newest `size` featured and
+    everything from the trending window) are kept in memory with their
+    counters. A background task re-ranks them every `refresh_interval`,
+    after loading posts created since the last refresh and those marked with
+    post_changed; counter flushes are applied as they happen. Every
+    `rebuild_interval` the candidates are reloaded from the database, which
+    picks up changes made by other processes.
+    """
+
+    def __init__(
+        self,
+        engine,
+        size: int,
+        window_days: float,
+        refresh_interval: float,
+        rebuild_interval: float,
+    ):
+        self.engine = engine
+        self.size = size
+        self.window = timedelta(days=window_days).total_seconds()
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._entries: Dict[int, _Entry] = {}
+        self._feeds: Dict[str, List[FeedKey]] = {
+            kind: [] for kind in get_args(FeedKind)
+        }
+        self._dirty: Set[int] = set()
+        self._max_id = 0
+        self._rebuilt_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        # Set once the first rebuild has finished
+        self.built = asyncio.Event()
+
+    def page(
+        self, kind: FeedKind, after: Optional[FeedKey], limit: int
+    ) -> Tuple[List[int], Optional[FeedKey]]:
+        """
+        Ids of the `limit` posts following the key `after` in feed `kind`,
+        and the key to continue from (None on the last page).
+        """
+        keys = self._feeds[kind]
+        start = bisect.bisect_right(keys, after) if after else 0
+        chunk = keys[start : start + limit + 1]
+        next_key = chunk[limit - 1] if len(chunk) > limit else None
+        return [row_id for _, row_id in chunk[:limit]], next_key
+
+    def post_changed(self, post_id: int) -> None:
+        """
+        Reload `post_id` (or drop it, if deleted) at the next refresh.
+        """
+        self._dirty.add(post_id)
+
+    def apply_counts(self, deltas: CounterDeltas) -> None:
+        for (model, column, row_id), amount in deltas.items():
+            entry = self._entries.get(row_id)
+            if model is Post and entry is not None and column in TRENDING_COUNTERS:
+                value = getattr(entry, column) + amount
+                self._entries[row_id] = entry._replace(**{column: value})
+
+    def _add(self, rows) -> None:
+        for row in rows:
+            self._entries[row.id] = _Entry(
+                _timestamp(row.created_at),
+                row.is_featured,
+                row.likes_count or 0,
+                row.comment_count or 0,
+                row.view_count or 0,
+            )
+            self._max_id = max(self._max_id, row.id)
+
+    def _rank(
+        self, entries: Dict[int, _Entry], now: float
+    ) -> Tuple[Dict[str, List[FeedKey]], Set[int]]:
+        """
+        The feeds ranked from `entries`, and the ids of the entries that can
+        still enter a feed before the next rebuild.
+        """
+        cutoff = now - self.window
+        # Only the top `size` of each feed is sorted
+        latest = heapq.nsmallest(
+            self.size, ((-entry.created_at, i) for i, entry in entries.items())
+        )
+        featured = heapq.nsmallest(
+            self.size,
+            (
+                (-entry.created_at, i)
+                for i, entry in entries.items()
+                if entry.is_featured
+            ),
+        )
+        recent = [i for i, entry in entries.items() if entry.created_at >= cutoff]
+        trending = heapq.nsmallest(
+            self.size, ((-trending_score(entries[i], now), i) for i in recent)
+        )
+        feeds = {"featured": featured, "trending": trending, "latest": latest}
+        keep = {row_id for _, row_id in latest + featured}.union(recent)
+        return feeds, keep
+
+    async def _rerank(self, now: float) -> None:
+        # Scoring every candidate takes ~200 ms of CPU at 100k posts, so it
+        # runs in a thread, on a copy of the entries, instead of stalling the
+        # event loop; pages are served from the previous feeds meanwhile
+        feeds, keep = await asyncio.to_thread(self._rank, dict(self._entries), now)
+        self._feeds = feeds
+        # Forget posts that can no longer enter a feed. Entries are taken from
+        # the live dict, which has the counts applied during ranking
+        entries = self._entries
+        self._entries = {row_id: entries[row_id] for row_id in keep}
+
+    async def rebuild(self) -> None:
+        now = time.time()
+        cutoff = datetime.fromtimestamp(now - self.window, timezone.utc).replace(
+            tzinfo=None
+        )
+        newest = select(*_COLUMNS).order_by(Post.created_at.desc(), Post.id.desc())
+        async with self.engine.connect() as conn:
+            latest = await conn.execute(newest.limit(self.size))
+            featured = await conn.execute(
+                newest.where(Post.is_featured).limit(self.size)
+            )
+            recent = await conn.execute(
+                select(*_COLUMNS).where(Post.created_at >= cutoff)
+            )
+            self._entries = {}
+            self._add(latest)
+            self._add(featured)
+            self._add(recent)
+        await self._rerank(now)
+        self._rebuilt_at = now
+        self.built.set()
+
+    async def refresh(self) -> None:
+        dirty, self._dirty = self._dirty, set()
+        statement = select(*_COLUMNS).where(
+            or_(Post.id > self._max_id, Post.id.in_(dirty))
+        )
+        try:
+            async with self.engine.connect() as conn:
+                rows = (await conn.execute(statement)).all()
+        except Exception:
+            self._dirty |= dirty
+            raise
+        for post_id in dirty:
+            self._entries.pop(post_id, None)
+        self._add(rows)
+        await self._rerank(time.time())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if time.time() - self._rebuilt_at >= self.rebuild_interval:
+                    await self.rebuild()
+                else:
+                    await self.refresh()
+            except Exception:
+                logger.exception("Feed refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        # The event must belong to the running loop, so create it here
+        self.built = asyncio.Event()
+        counter_buffer.listeners.append(self.apply_counts)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.apply_counts in counter_buffer.listeners:
+            counter_buffer.listeners.remove(self.apply_counts)
+
+
+feed_ranking = FeedRanking(
+    async_engine,
+    settings.FEED_SIZE,
+    settings.FEED_TRENDING_WINDOW_DAYS,
+    settings.FEED_REFRESH_SECONDS,
+    settings.FEED_REBUILD_SECONDS,
+)
@@ -0,0 +1,58 @@
+from functools import lru_cache
+from typing import FrozenSet, Optional, Tuple, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy.orm import load_only
+
+# A set of schema field names, or None for every field
+Fieldset = Optional[FrozenSet[str]]
+
+
+def parse_fields(fields: Optional[str], schema: Type[BaseModel]) -> Fieldset:
+    """
+    Parse a comma-separated `fields` query parameter into names of `schema`
+    fields, raising a 400 if any is unknown. Missing or empty means all.
+    """
+    if not fields:
+        return None
+    names = frozenset(name.strip() for name in fields.split(",") if name.strip())
+    unknown = names - schema.model_fields.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+    return names or None
+
+
+@lru_cache(maxsize=256)
+def partial_schema(schema: Type[BaseModel], fieldset: Fieldset) -> Type[BaseModel]:
+    """
+    `schema` restricted to `fieldset`. Validating from attributes only reads
+    those fields, so columns left unloaded by load_fields are never touched.
+    """
+    if fieldset is None:
+        return schema
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            name: (info.annotation, info)
+            for name, info in schema.model_fields.items()
+            if name in fieldset
+        },
+    )
+
+
+def load_fields(model, fieldset: Fieldset, *required) -> Tuple:
+    """
+    Loader options that load only the columns of `model` behind `fieldset`,
+    plus the `required` ones (sort keys, ETag versions); other columns are
+    left out of the SELECT. Empty, so everything loads, when `fieldset` is None.
+    """
+    if fieldset is None:
+        return ()
+    columns = model.__table__.columns.keys()
+    selected = [getattr(model, name) for name in columns if name in fieldset]
+    return (load_only(*selected, *required),)
@@ -0,0 +1,278 @@
+"""
+Generate a large synthetic dataset of users, posts and threaded comments.
+
+Rows are written straight to the database given by --database (required, so
+the app's DATABASE_URL is never written to by accident) with batched
+executemany inserts, bypassing the API, so tens of millions of rows take
+minutes instead of days. Every user shares one precomputed password hash.
+The same --seed (and --until) always produces the same data.
+
+Usage:
+    python -m app.generate_data --database sqlite:///./blog.db \\
+        --users 100000 --posts-per-author 40 --comments-per-post 8 --seed 1
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlmodel import create_engine
+
+from app.auth import hash_password, hashing_pool
+from app.database import create_db_and_tables, normalize_url
+from app.models import Comment, Post, User
+from app.models_enums import UserRole, UserStatus
+from app.search import create_search_index, drop_search_index
+
+FIRST_NAMES = ["Alice", "Bob", "Carol", "Dan", "Eve", "Frank", "Grace", "Heidi"]
+LAST_NAMES = ["Smith", "Jones", "Brown", "Wilson", "Taylor", "Clark", "Lee"]
+VOCABULARY = (
+    "the of and to in is that for it as with was on be by this are or from at an "
+    "but not have all which one they more you has their about would been its "
+    "data system design post blog python database query index cache server user "
+    "request response latency write read model async thread stream batch page "
+    "search ranking feed comment reply author review idea story guide tutorial"
+).split()
+
+
+def word_range(value: str) -> Tuple[int, int]:
+    low, _, high = value.partition(":")
+    return int(low), int(high or low)
+
+
+class Generator:
+    def __init__(self, args, conn):
+        self.args = args
+        self.conn = conn
+        self.rnd = random.Random(args.seed)
+        # A pool of words to slice content from, Zipf-weighted like real text
+        weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+        self.words = self.rnd.choices(VOCABULARY, weights, k=1_000_000)
+        self.until = args.until
+        self.span = timedelta(days=args.days).total_seconds()
+        self.users: List[dict] = []
+        self.posts: List[dict] = []
+        self.comments: List[dict] = []
+        self.counts = {"users": 0, "posts": 0, "comments": 0}
+        self.reported = 0
+        self.user_ids = range(0)
+        self.post_ids = range(0)
+
+    def next_id(self, model) -> int:
+        return (self.conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+    def text(self, bounds: Tuple[int, int]) -> str:
+        length = self.rnd.randint(*bounds)
+        start = self.rnd.randrange(len(self.words) - length)
+        return " ".join(self.words[start : start + length])
+
+    def timestamp(self, after: datetime = None) -> datetime:
+        if after is None:
+            return self.until - timedelta(seconds=self.rnd.random() * self.span)
+        remaining = (self.until - after).total_seconds()
+        return after + timedelta(seconds=self.rnd.random() * remaining)
+
+    def flush(self) -> None:
+        # Parents before children, so foreign keys are satisfied
+        for name, model, rows in (
+            ("users", User, self.users),
+            ("posts", Post, self.posts),
+            ("comments", Comment, self.comments),
+        ):
+            if rows:
+                self.conn.execute(insert(model), rows)
+                self.counts[name] += len(rows)
+                rows.clear()
+        self.conn.commit()
+
+        total = sum(self.counts.values())
+        if total - self.reported >= 1_000_000:
+            self.reported = total
+            print(f"  {self.counts['posts']} posts, {self.counts['comments']} comments")
+
+    def run(self) -> None:
+        args = self.args
+        password_hash = hash_password(args.password)
+        user_id = first_user_id = self.next_id(User)
+        post_id = first_post_id = self.next_id(Post)
+        comment_id = self.next_id(Comment)
+
+        authors = []
+        for n in range(args.users):
+            created_at = self.timestamp()
+            if n == 0:
+                role = UserRole.admin
+            elif self.rnd.random() < args.author_ratio:
+                role = UserRole.author
+            else:
+                role = UserRole.reader
+            self.users.append(
+                {
+                    "id": user_id,
+                    "username": f"user{user_id}",
+                    "email": f"user{user_id}@example.com",
+                    "hashed_password": password_hash,
+                    "first_name": self.rnd.choice(FIRST_NAMES),
+                    "last_name": self.rnd.choice(LAST_NAMES),
+                    "bio": self.text((5, 20)),
+                    "role": role,
+                    "status": UserStatus.active,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+            )
+            if role != UserRole.reader:
+                authors.append((user_id, created_at))
+            user_id += 1
+            if len(self.users) >= args.batch_size:
+                self.flush()
+        self.flush()
+        self.user_ids = range(first_user_id, user_id)
+        print(f"Created {self.counts['users']} users (admin: user{first_user_id})")
+
+        for author_id, joined_at in authors:
+            for _ in range(round(self.rnd.expovariate(1 / args.posts_per_author))):
+                created_at = self.timestamp(after=joined_at)
+                n_comments = round(self.rnd.expovariate(1 / args.comments_per_post))
+                self.posts.append(
+                    {
+                        "id": post_id,
+                        "title": self.text((3, 10)).capitalize(),
+                        "content": self.text(args.post_words),
+                        "author_id": author_id,
+                        "created_at": created_at,
+                        "updated_at": created_at,
+                        "view_count": round(self.rnd.expovariate(1 / 200)),
+                        "is_featured": self.rnd.random() < args.featured_ratio,
+                        "allow_comments": True,
+                        "likes_count": round(self.rnd.expovariate(1 / 10)),
+                        "comment_count": n_comments,
+                    }
+                )
+                self.add_comments(post_id, created_at, n_comments, comment_id)
+                comment_id += n_comments
+                post_id += 1
+                if len(self.posts) + len(self.comments) >= args.batch_size:
+                    self.flush()
+        self.flush()
+        self.post_ids = range(first_post_id, post_id)
+
+    def add_comments(
+        self, post_id: int, after: datetime, count: int, first_id: int
+    ) -> None:
+        # (id, depth, created_at) of this post's comments so far, in order
+        thread: List[Tuple[int, int, datetime]] = []
+        for comment_id in range(first_id, first_id + count):
+            parent_id, depth, created_at = None, 0, self.timestamp(after=after)
+            if thread and self.rnd.random() < self.args.reply_ratio:
+                parent = self.rnd.choice(thread)
+                if parent[1] < self.args.max_depth:
+                    parent_id, depth = parent[0], parent[1] + 1
+                    created_at = self.timestamp(after=parent[2])
+            thread.append((comment_id, depth, created_at))
+            self.comments.append(
+                {
+                    "id": comment_id,
+                    "post_id": post_id,
+                    "user_id": self.rnd.choice(self.user_ids),
+                    "parent_id": parent_id,
+                    "content": self.text(self.args.comment_words),
+                    "created_at": created_at,
+                    "likes_count": round(self.rnd.expovariate(1 / 2)),
+                }
+            )
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--database",
+        required=True,
+        help="URL of the database to write to, e.g. sqlite:///./blog.db",
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument(
+        "--author-ratio",
+        type=float,
+        default=0.2,
+        help="fraction of users who write posts",
+    )
+    parser.add_argument(
+        "--posts-per-author",
+        type=float,
+        default=20,
+        help="mean of the (exponential) number of posts per author",
+    )
+    parser.add_argument(
+        "--comments-per-post",
+        type=float,
+        default=5,
+        help="mean of the (exponential) number of comments per post",
+    )
+    parser.add_argument(
+        "--reply-ratio",
+        type=float,
+        default=0.5,
+        help="probability that a comment replies to an earlier one",
+    )
+    parser.add_argument("--max-depth", type=int, default=5, help="deepest reply level")
+    parser.add_argument(
+        "--post-words", type=word_range, default="50:400", help="MIN:MAX words"
+    )
+    parser.add_argument(
+        "--comment-words", type=word_range, default="5:60", help="MIN:MAX words"
+    )
+    parser.add_argument("--featured-ratio", type=float, default=0.05)
+    parser.add_argument("--days", type=float, default=365, help="timestamp spread")
+    parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        default=datetime.now(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0, tzinfo=None
+        ),
+        help="newest timestamp (UTC), default today at midnight",
+    )
+    parser.add_argument("--password", default="password", help="every user's password")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    return parser.parse_args(argv)
+
+
+def generate(args: argparse.Namespace) -> Generator:
+    """
+    Create the tables if needed and write the dataset described by `args`.
+    """
+    engine = create_engine(normalize_url(args.database))
+    create_db_and_tables(engine)
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            # The data is reproducible, so trade durability for load speed
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        # Index posts once at the end instead of row by row
+        drop_search_index(conn)
+        conn.commit()
+        generator = Generator(args, conn)
+        generator.run()
+        print("Building the search index...")
+        create_search_index(conn)
+        conn.commit()
+    engine.dispose()
+    return generator
+
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    generator = generate(args)
+    hashing_pool.shutdown()
+
+    total = sum(generator.counts.values())
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import atexit
+import json
+import logging
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+from app.config import settings
+
+# Correlation ID of the request being handled, set by LoggingMiddleware
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Render a record as a single JSON line, including the request ID and any
+    structured fields passed as `extra={"fields": {...}}`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": request_id_var.get(),
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging() -> QueueListener:
+    """
+    Route all logging through a queue drained by a background thread, so request
+    handlers never block on writes to stdout.
+
+    Records are formatted on the calling side (where the request ID context var
+    is visible) and only the finished line crosses the queue.
+    """
+    log_queue = SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(JSONFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+
+    # SQL echo is controlled here rather than with create_engine(echo=...),
+    # which would attach its own blocking stdout handler
+    logging.getLogger("sqlalchemy.engine").setLevel(
+        logging.INFO if settings.ECHO else logging.WARNING
+    )
+
+    listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -1,31 +1,70 @@
+import logging
 from contextlib import asynccontextmanager
 from datetime import timedelta
 
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette.middleware.cors import CORSMiddleware
 
-from app.auth import authenticate_user, create_access_token
+from app.auth import authenticate_user, create_access_token, hashing_pool
+from app.compression import available_encoders
 from app.config import settings
-from app.database import create_db_and_tables, get_session
-from app.middleware import TimingMiddleware, LoggingMiddleware, RateLimitingMiddleware
+from app.counters import counter_buffer
+from app.database import (
+    async_engine,
+    create_db_and_tables,
+    get_async_session,
+    replicas,
+    write_engine,
+)
+from app.feed import feed_ranking
+from app.logging_config import setup_logging
+from app.metrics import render_metrics
+from app.middleware import (
+    CompressionMiddleware,
+    TimingMiddleware,
+    LoggingMiddleware,
+    MetricsMiddleware,
+    RateLimitingMiddleware,
+)
+from app.rate_limit import create_backend
+from app.routes.comments import comment_router
 from app.routes.posts import post_router
 from app.routes.users import user_router
 from app.schemas import Token
+from app.warmup import readiness
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Starting up the FastAPI application...")
-    create_db_and_tables()
+    logger.info("Starting up the FastAPI application...")
+    if settings.CREATE_TABLES_ON_STARTUP:
+        create_db_and_tables()
+    counter_buffer.start()
+    feed_ranking.start()
+    readiness.start()
     yield
-    print("Shutting down the FastAPI application...")
+    logger.info("Shutting down the FastAPI application...")
+    await readiness.stop()
+    await feed_ranking.stop()
+    await counter_buffer.stop()
+    hashing_pool.shutdown()
+    await async_engine.dispose()
+    await write_engine.dispose()
+    for replica in replicas.engines:
+        await replica.dispose()
 
 
 app = FastAPI(lifespan=lifespan, title="Blog App", version="0.1.0")
 app.include_router(user_router)
 app.include_router(post_router)
+app.include_router(comment_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,9 +75,27 @@ app.add_middleware(
 )
 
 # Add our custom middleware
-app.add_middleware(TimingMiddleware)
-app.add_middleware(LoggingMiddleware)
-app.add_middleware(RateLimitingMiddleware, max_requests=100, window_seconds=60)
+app.add_middleware(
+    CompressionMiddleware,
+    encoders=available_encoders(settings.COMPRESSION_ENCODINGS),
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+)
+app.add_middleware(TimingMiddleware, db_stats_headers=settings.DB_STATS_HEADERS)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(
+    LoggingMiddleware,
+    success_sample_rate=settings.LOG_SUCCESS_SAMPLE_RATE,
+    exclude_paths=settings.UNMETERED_PATHS,
+)
+app.add_middleware(
+    RateLimitingMiddleware,
+    max_requests=settings.RATE_LIMIT_MAX_REQUESTS,
+    window_seconds=settings.RATE_LIMIT_WINDOW_SECONDS,
+    key_by=settings.RATE_LIMIT_KEY,
+    route_limits=settings.RATE_LIMIT_ROUTES,
+    backend=create_backend(),
+    exclude_paths=settings.UNMETERED_PATHS,
+)
 
 
 # Root endpoint
@@ -47,11 +104,34 @@ async def root():
     return {"message": "Welcome to FastAPI"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """
+    Liveness: the process is up and serving requests.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """
+    Readiness: 503 until warm-up has finished, and again during shutdown.
+    """
+    if not readiness.ready:
+        return JSONResponse({"status": "unavailable"}, status_code=503)
+    return {"status": "ready"}
+
+
 @app.post("/token", response_model=Token)
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), session=Depends(get_session)
+    form_data: OAuth2PasswordRequestForm = Depends(), session=Depends(get_async_session)
 ):
-    user = authenticate_user(form_data.username, form_data.password, session)
+    user = await authenticate_user(form_data.username, form_data.password, session)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -65,6 +145,8 @@ async def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-# start FastAPI application server
+# start FastAPI application server (for production, use python -m app.server)
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=settings.RELOAD)
+    uvicorn.run(
+        "app.main:app", host=settings.HOST, port=settings.PORT, reload=settings.RELOAD
+    )
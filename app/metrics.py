@@ -0,0 +1,182 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy.pool import Pool, QueuePool
+
+# Request latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = (
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        )
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """
+    Monotonic counter keyed by a tuple of label values.
+
+    Updates are plain dict operations with no lock: they happen on the event loop,
+    and a lost increment from a worker thread is acceptable for monitoring data.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for labels, value in self.values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, labels: Tuple[str, ...] = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, labels: Tuple[str, ...] = ()) -> None:
+        self.values[labels] = value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.series: Dict[Tuple[str, ...], list] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        labelnames = self.labelnames + ("le",)
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(labelnames, labels + (le,)),
+                    cumulative,
+                )
+            label_str = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum", label_str, total
+            yield f"{self.name}_count", label_str, cumulative
+
+
+REGISTRY: List = []
+# Callables run at scrape time to refresh gauges derived from other state
+COLLECTORS: List[Callable[[], None]] = []
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by method, route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time until the response headers are sent, by method and route template.",
+    ("method", "route"),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled."
+)
+RATE_LIMITED = Counter(
+    "rate_limit_rejections_total", "Requests rejected with 429 by the rate limiter."
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool.",
+    ("engine",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+POOL_SIZE = Gauge("db_pool_size", "Configured pool size.", ("engine",))
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections currently checked out.", ("engine",)
+)
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections open beyond pool_size.", ("engine",)
+)
+
+
+def timed_pool_class(base: type, engine_name: str) -> type:
+    """
+    Subclass a SQLAlchemy pool class so every checkout records its wait time.
+
+    A subclass (rather than patching an instance) survives engine.dispose(),
+    which recreates the pool from its class.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return base._do_get(self)
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, (engine_name,))
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+
+
+def register_pool(engine_name: str, get_pool: Callable[[], Pool]) -> None:
+    """
+    Report size, checked-out and overflow counts of an engine's pool at scrape time.
+    """
+
+    def collect():
+        pool = get_pool()
+        labels = (engine_name,)
+        if isinstance(pool, QueuePool):
+            POOL_SIZE.set(pool.size(), labels)
+            POOL_CHECKED_OUT.set(pool.checkedout(), labels)
+            # QueuePool counts overflow from -pool_size until the pool is full
+            POOL_OVERFLOW.set(max(pool.overflow(), 0), labels)
+
+    COLLECTORS.append(collect)
+
+
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    for collect in COLLECTORS:
+        collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,72 +1,226 @@
+import logging
+import random
 import time
-from typing import Callable, Dict
+import uuid
+from typing import Callable, Dict, Iterable, Optional, Tuple
 
 import jwt
 from fastapi import Request, Response, status
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from app.auth import ALGORITHM, SECRET_KEY
+from app.auth import ALGORITHM, SECRET_KEY, decode_token
+from app.compression import COMPRESSIBLE_TYPES, Encoder, choose_encoding
+from app.logging_config import request_id_var
+from app.metrics import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, RATE_LIMITED
+from app.query_stats import QueryStats, query_stats_var
+from app.rate_limit import MemoryBackend, SlidingWindowLimiter, match_route_limit
+
+logger = logging.getLogger("app.access")
 
 
 # 1. Request Timing Middleware
-class TimingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable):
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
+class TimingMiddleware:
+    """
+    Add X-Process-Time and collect per-request SQL statement stats, optionally
+    reported as X-DB-Queries / X-DB-Time (milliseconds).
+    """
+
+    def __init__(self, app: ASGIApp, db_stats_headers: bool = False):
+        self.app = app
+        self.db_stats_headers = db_stats_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start_time = time.perf_counter()
+        stats = QueryStats()
+        token = query_stats_var.set(stats)
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                process_time = time.perf_counter() - start_time
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", str(process_time))
+                if self.db_stats_headers:
+                    headers.append("X-DB-Queries", str(stats.count))
+                    headers.append("X-DB-Time", f"{stats.total_time * 1000:.3f}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            query_stats_var.reset(token)
 
 
 # 2. Request Logging Middleware
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable):
-        print(
-            f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {request.method} {request.url.path}"
-        )
-        response = await call_next(request)
-        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Status: {response.status_code}")
-        return response
+class LoggingMiddleware:
+    """
+    Tag each request with a correlation ID (taken from X-Request-ID or generated)
+    and write one structured access log line per response.
+
+    Successful responses are sampled at `success_sample_rate`; 4xx/5xx responses
+    and unhandled exceptions are always logged. Responses on `exclude_paths`
+    (e.g. health probes) get no access log line.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        success_sample_rate: float = 1.0,
+        exclude_paths: Iterable[str] = (),
+    ):
+        self.app = app
+        self.success_sample_rate = success_sample_rate
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = Headers(scope=scope).get("x-request-id") or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        start_time = time.perf_counter()
+        log_access = scope["path"] not in self.exclude_paths
+
+        async def send_with_logging(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+                status_code = message["status"]
+                if log_access and (
+                    status_code >= 400 or random.random() < self.success_sample_rate
+                ):
+                    logger.log(
+                        logging.WARNING if status_code >= 500 else logging.INFO,
+                        "%s %s %s",
+                        scope["method"],
+                        scope["path"],
+                        status_code,
+                        extra={
+                            "fields": {
+                                "method": scope["method"],
+                                "path": scope["path"],
+                                "status": status_code,
+                                "duration_ms": round(
+                                    (time.perf_counter() - start_time) * 1000, 3
+                                ),
+                            }
+                        },
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_logging)
+        except Exception:
+            logger.exception("Unhandled error on %s %s", scope["method"], scope["path"])
+            raise
+        finally:
+            request_id_var.reset(token)
 
 
 # 3. Rate Limiting Middleware
-class RateLimitingMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, max_requests: int = 10, window_seconds: int = 60):
-        super().__init__(app)
+class RateLimitingMiddleware:
+    """
+    Sliding-window rate limiting keyed by client IP or, with key_by="user", by the
+    authenticated username (falling back to IP for anonymous requests).
+
+    `route_limits` maps path prefixes to (max_requests, window_seconds) overrides,
+    and requests to `exclude_paths` (e.g. health probes) are never limited.
+    Counters live in `backend`, which can be shared across workers.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_requests: int = 10,
+        window_seconds: int = 60,
+        key_by: str = "ip",
+        route_limits: Optional[Dict[str, Tuple[int, int]]] = None,
+        backend=None,
+        exclude_paths: Iterable[str] = (),
+    ):
+        self.app = app
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.request_records: Dict[str, list] = {}
+        self.key_by = key_by
+        self.route_limits = route_limits or {}
+        self.limiter = SlidingWindowLimiter(backend or MemoryBackend())
+        self.exclude_paths = frozenset(exclude_paths)
 
-    async def dispatch(self, request: Request, call_next: Callable):
-        # Simple in-memory rate limiting by IP
-        client_ip = request.client.host
-        current_time = time.time()
-
-        # Initialize or clean expired timestamps
-        if client_ip not in self.request_records:
-            self.request_records[client_ip] = []
-
-        self.request_records[client_ip] = [
-            timestamp
-            for timestamp in self.request_records[client_ip]
-            if current_time - timestamp < self.window_seconds
-        ]
+    def _client_key(self, scope: Scope) -> str:
+        if self.key_by == "user":
+            authorization = Headers(scope=scope).get("authorization", "")
+            if authorization.startswith("Bearer "):
+                try:
+                    username = decode_token(authorization[7:]).get("sub")
+                except jwt.PyJWTError:
+                    username = None
+                if username:
+                    return f"user:{username}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
 
-        # Check rate limit
-        if len(self.request_records[client_ip]) >= self.max_requests:
-            return Response(
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            return await self.app(scope, receive, send)
+
+        key = self._client_key(scope)
+        max_requests, window_seconds = self.max_requests, self.window_seconds
+        route_limit = match_route_limit(scope["path"], self.route_limits)
+        if route_limit:
+            prefix, (max_requests, window_seconds) = route_limit
+            key = f"{key}:{prefix}"
+
+        allowed, retry_after = await self.limiter.hit(key, max_requests, window_seconds)
+        if not allowed:
+            response = Response(
                 content="Rate limit exceeded. Please try again later.",
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(retry_after)},
             )
-
-        # Add current request timestamp
-        self.request_records[client_ip].append(current_time)
+            RATE_LIMITED.inc()
+            return await response(scope, receive, send)
 
         # Process request
-        return await call_next(request)
+        await self.app(scope, receive, send)
+
+
+# 4. Metrics Middleware
+class MetricsMiddleware:
+    """
+    Record request counts, latency and in-flight requests per route template
+    (e.g. /posts/{post_id}), so label cardinality stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start_time = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
 
+        async def send_with_metrics(message: Message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                route_path = getattr(route, "path", "<unmatched>")
+                HTTP_LATENCY.observe(
+                    time.perf_counter() - start_time, (scope["method"], route_path)
+                )
+                HTTP_REQUESTS.inc((scope["method"], route_path, str(message["status"])))
+            await send(message)
 
-# 4. JWT Verification Middleware (alternative approach to dependencies)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+
+
+# 5. JWT Verification Middleware (alternative approach to dependencies)
 class JWTMiddleware(BaseHTTPMiddleware):
     def __init__(self, app, exclude_paths=None):
         super().__init__(app)
@@ -108,3 +262,92 @@ class JWTMiddleware(BaseHTTPMiddleware):
 
         # Process request
         return await call_next(request)
+
+
+# 6. Compression Middleware
+class CompressionMiddleware:
+    """
+    Compress responses with the first encoding of `encoders` that the client
+    accepts, chunk by chunk as the body is sent, so streaming responses are
+    never buffered.
+
+    Bodies smaller than `minimum_size`, non-2xx responses (304s have no body),
+    HEAD requests, content types that are not compressible, bodies that
+    already have a Content-Encoding and `Cache-Control: no-transform` are sent
+    as they are. Strong ETags are weakened on compressed responses, since the
+    bytes no longer match the uncompressed representation.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        encoders: Dict[str, Callable[[], Encoder]],
+        minimum_size: int = 1024,
+    ):
+        self.app = app
+        self.encoders = encoders
+        self.minimum_size = minimum_size
+
+    def _eligible(self, status_code: int, headers: Headers) -> bool:
+        return (
+            200 <= status_code < 300
+            and status_code not in (204, 206)
+            and "content-encoding" not in headers
+            and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            and "no-transform" not in headers.get("cache-control", "")
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+
+        encoding = choose_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), list(self.encoders)
+        )
+        # Response start held back until the first body chunk shows whether
+        # the response is worth compressing
+        pending_start: Optional[Message] = None
+        encoder: Optional[Encoder] = None
+
+        async def send_compressed(message: Message):
+            nonlocal pending_start, encoder
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if self._eligible(message["status"], headers):
+                    MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                    length = headers.get("content-length")
+                    if encoding and (
+                        length is None or int(length) >= self.minimum_size
+                    ):
+                        pending_start = message
+                        return
+                return await send(message)
+
+            if message["type"] != "http.response.body" or (
+                pending_start is None and encoder is None
+            ):
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                start, pending_start = pending_start, None
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start)
+                    return await send(message)
+                encoder = self.encoders[encoding]()
+                headers = MutableHeaders(scope=start)
+                del headers["content-length"]
+                headers["content-encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["etag"] = f"W/{etag}"
+                await send(start)
+
+            data = encoder.compress(body)
+            data += encoder.flush() if more_body else encoder.finish()
+            await send(
+                {"type": "http.response.body", "body": data, "more_body": more_body}
+            )
+
+        await self.app(scope, receive, send_compressed)
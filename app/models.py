@@ -3,12 +3,18 @@ from typing import Optional, List
 
 from fastapi.params import Depends
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, select, Session,Relationship
 
 from .database import engine, get_session
 from .models_enums import UserRole, UserStatus
 
 class User(SQLModel, table=True):
+    __table_args__ = (
+        # Backs keyset pagination on (created_at, id)
+        Index("ix_user_created_at_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str = Field(index=True, unique=True)
     email: str = Field(index=True, unique=True)
@@ -25,6 +31,13 @@ class User(SQLModel, table=True):
     comments: List["Comment"] = Relationship(back_populates="user")  # Relationship to Comment model
     
 class Post(SQLModel, table=True):
+    __table_args__ = (
+        # Back keyset pagination on (created_at, id), optionally filtered
+        Index("ix_post_created_at_id", "created_at", "id"),
+        Index("ix_post_author_id_created_at_id", "author_id", "created_at", "id"),
+        Index("ix_post_is_featured_created_at_id", "is_featured", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     content: str
@@ -35,11 +48,25 @@ class Post(SQLModel, table=True):
     is_featured: bool = False
     allow_comments: bool = True
     likes_count: Optional[int] = 0
+    # Denormalized number of comments, maintained through app.counters
+    comment_count: Optional[int] = 0
     user: Optional["User"] =  Relationship(back_populates="posts")
     comments:List["Comment"]=Relationship(back_populates="post")
 
+    @property
+    def author_name(self) -> str:
+        # Read by PostSchema; load `user` eagerly (see app.queries) to avoid N+1
+        return self.user.username if self.user else "Unknown"
+
 
 class Comment(SQLModel, table=True):
+    __table_args__ = (
+        # Keyset pagination of a post's top-level comments
+        Index("ix_comment_post_id_parent_id_created_at_id", "post_id", "parent_id", "created_at", "id"),
+        # Recursive step of the thread CTE (children of a comment)
+        Index("ix_comment_parent_id", "parent_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     post_id: int = Field(foreign_key="post.id")
     user_id: int = Field(foreign_key="user.id")
@@ -70,3 +97,9 @@ def get_user(username: str, session) -> Optional[User]:
     statement = select(User).where(User.username == username)
     user = session.exec(statement).first()
     return user
+
+
+async def get_user_async(username: str, session) -> Optional[User]:
+    statement = select(User).where(User.username == username)
+    user = (await session.exec(statement)).first()
+    return user
@@ -0,0 +1,105 @@
+from typing import Optional
+
+from sqlalchemy import delete, func, literal
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
+
+from app.models import Comment, Post, User
+
+
+def select_posts(*columns):
+    """
+    Select posts with the author's username joined into the same statement,
+    so reading `Post.author_name` never issues a per-row lazy load.
+
+    Extra `columns` are selected alongside each post.
+    """
+    return select(Post, *columns).options(
+        joinedload(Post.user).load_only(User.username, User.updated_at)
+    )
+
+
+async def get_post_with_author(post_id: int, session, *options) -> Optional[Post]:
+    statement = select_posts().options(*options).where(Post.id == post_id)
+    post = (await session.exec(statement)).first()
+    return post
+
+
+def post_version(post: Post) -> tuple:
+    """
+    Values that change whenever the serialized post changes, including a rename
+    of its author.
+    """
+    author_updated_at = post.user.updated_at if post.user else None
+    return post.id, post.updated_at, author_updated_at
+
+
+async def get_post_version(post_id: int, session) -> Optional[tuple]:
+    """
+    Fetch only the version columns of a post, for answering conditional GETs.
+    """
+    statement = (
+        select(Post.updated_at, User.updated_at)
+        .outerjoin(User, Post.author_id == User.id)
+        .where(Post.id == post_id)
+    )
+    row = (await session.exec(statement)).first()
+    return (post_id, *row) if row else None
+
+
+def _comment_subtree(anchor, max_depth: Optional[int] = None):
+    """
+    Recursive CTE of (id, depth) for the comments matching `anchor` and their
+    descendants, at most `max_depth` levels below them.
+    """
+    tree = (
+        select(Comment.id, literal(0).label("depth"))
+        .where(anchor)
+        .cte("comment_tree", recursive=True)
+    )
+    step = select(Comment.id, tree.c.depth + 1).join(
+        tree, Comment.parent_id == tree.c.id
+    )
+    if max_depth is not None:
+        step = step.where(tree.c.depth < max_depth)
+    return tree.union_all(step)
+
+
+def select_comment_tree(anchor, max_depth: Optional[int] = None):
+    """
+    Select whole comment threads in one statement, as (Comment, depth, username)
+    rows ordered oldest first.
+    """
+    tree = _comment_subtree(anchor, max_depth)
+    return (
+        select(Comment, tree.c.depth, User.username)
+        .join(tree, Comment.id == tree.c.id)
+        .outerjoin(User, Comment.user_id == User.id)
+        .order_by(Comment.created_at, Comment.id)
+    )
+
+
+def comment_depth(comment_id: int):
+    """
+    Scalar subquery of how many levels comment `comment_id` is below the top
+    level of its post (0 for a top-level comment), walking up its parents.
+    """
+    ancestors = (
+        select(Comment.id, Comment.parent_id)
+        .where(Comment.id == comment_id)
+        .cte("comment_ancestors", recursive=True)
+    )
+    ancestors = ancestors.union_all(
+        select(Comment.id, Comment.parent_id).join(
+            ancestors, Comment.id == ancestors.c.parent_id
+        )
+    )
+    return select(func.count() - 1).select_from(ancestors).scalar_subquery()
+
+
+def delete_comment_tree(comment_id: int):
+    """
+    Delete a comment together with all of its replies, at any depth.
+    """
+    tree = _comment_subtree(Comment.id == comment_id)
+    return delete(Comment).where(Comment.id.in_(select(tree.c.id)))
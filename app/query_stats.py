@@ -0,0 +1,120 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+logger = logging.getLogger("app.sql")
+
+
+class QueryStats:
+    """
+    Number of SQL statements and total time spent in them during one request.
+    """
+
+    __slots__ = ("count", "total_time")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+
+
+# Stats of the request being handled, set by TimingMiddleware
+query_stats_var: ContextVar[Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+
+# Statements EXPLAIN accepts; DDL, transaction control, PRAGMA and the like
+# make it fail
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    if conn.dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif conn.dialect.name == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return None
+    # A separate DBAPI cursor, so the original statement's pending rows are untouched
+    cursor = conn.connection.cursor()
+    # On PostgreSQL a failed statement aborts the whole transaction, so run the
+    # EXPLAIN in a savepoint of the caller's transaction and roll back to it on
+    # failure. Issued on the DBAPI cursor so it is not itself instrumented.
+    savepoint = conn.dialect.name == "postgresql"
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = cursor.fetchall()
+        except Exception:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return "\n".join(" ".join(str(col) for col in row) for row in plan)
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = query_stats_var.get()
+    if stats is not None:
+        stats.count += 1
+        stats.total_time += elapsed
+
+    if elapsed * 1000 < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+    plan = None
+    if (
+        settings.SLOW_QUERY_EXPLAIN
+        and not executemany
+        and not (context is not None and context.isddl)
+        and statement.lstrip().upper().startswith(EXPLAINABLE)
+    ):
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception:
+            logger.debug("EXPLAIN failed for slow query", exc_info=True)
+    logger.warning(
+        "Slow query (%.1f ms)",
+        elapsed * 1000,
+        extra={
+            "fields": {
+                "duration_ms": round(elapsed * 1000, 3),
+                "statement": statement,
+                "parameters": parameters,
+                "plan": plan,
+            }
+        },
+    )
+
+
+def _handle_error(context):
+    # after_cursor_execute never fires for a failed statement
+    if context.connection is not None:
+        start_times = context.connection.info.get("query_start_time")
+        if start_times:
+            start_times.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Count and time every statement executed on `engine`, attributing it to the
+    current request, and log statements slower than SLOW_QUERY_THRESHOLD_MS.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
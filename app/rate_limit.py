@@ -0,0 +1,233 @@
+import asyncio
+import math
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+
+class MemoryBackend:
+    """
+    Per-process counter store. Expired keys are swept at most once per
+    `sweep_interval` seconds, so idle clients don't accumulate.
+    """
+
+    def __init__(self, sweep_interval: float = 60):
+        self.sweep_interval = sweep_interval
+        self._counters: Dict[str, list] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def _sweep(self, now: float) -> None:
+        if now < self._next_sweep:
+            return
+        self._counters = {k: v for k, v in self._counters.items() if v[1] > now}
+        self._next_sweep = now + self.sweep_interval
+
+    async def incr_if_allowed(
+        self, key: str, ttl: int, other_key: str, other_weight: float, limit: int
+    ) -> Tuple[bool, int, int]:
+        """
+        Increment `key` (expiring `ttl` seconds after it was created) only if
+        `other_key` weighted by `other_weight` plus `key` stays within `limit`
+        with this hit. Returns whether it was counted and both counts after
+        the call; every backend does this atomically in a single round trip.
+        """
+        now = time.monotonic()
+        self._sweep(now)
+        entry = self._counters.get(key)
+        if entry is None or entry[1] <= now:
+            entry = self._counters[key] = [0, now + ttl]
+        other = self._counters.get(other_key)
+        previous = other[0] if other is not None and other[1] > now else 0
+        allowed = previous * other_weight + entry[0] + 1 <= limit
+        if allowed:
+            entry[0] += 1
+        return allowed, entry[0], previous
+
+
+_PREVIOUS_COUNT = (
+    "coalesce((SELECT count FROM rate_limit "
+    "WHERE key = :other_key AND expires_at > :now), 0)"
+)
+_CONDITIONAL_INCR = (
+    f"WITH previous (count) AS (SELECT {_PREVIOUS_COUNT}) "
+    "INSERT INTO rate_limit (key, count, expires_at) "
+    "SELECT :key, 1, :expires_at FROM previous "
+    "WHERE previous.count * :weight + 1 <= :limit "
+    "ON CONFLICT(key) DO UPDATE SET "
+    "count = CASE WHEN expires_at <= :now THEN 1 ELSE count + 1 END, "
+    "expires_at = CASE WHEN expires_at <= :now THEN excluded.expires_at "
+    "ELSE expires_at END "
+    "WHERE (SELECT count FROM previous) * :weight "
+    "+ CASE WHEN expires_at <= :now THEN 0 ELSE count END + 1 <= :limit "
+    f"RETURNING count, {_PREVIOUS_COUNT}"
+)
+_COUNTS = (
+    "SELECT coalesce((SELECT count FROM rate_limit "
+    f"WHERE key = :key AND expires_at > :now), 0), {_PREVIOUS_COUNT}"
+)
+# Same as _CONDITIONAL_INCR, for Redis
+_REDIS_CONDITIONAL_INCR = """
+local current = tonumber(redis.call("GET", KEYS[1]) or "0")
+local previous = tonumber(redis.call("GET", KEYS[2]) or "0")
+if previous * tonumber(ARGV[1]) + current + 1 > tonumber(ARGV[2]) then
+    return {0, current, previous}
+end
+current = redis.call("INCR", KEYS[1])
+if current == 1 then
+    redis.call("EXPIRE", KEYS[1], ARGV[3])
+end
+return {1, current, previous}
+"""
+
+
+class SQLiteBackend:
+    """
+    Counter store in a local SQLite file, shared by every worker on the host.
+
+    Queries run on a dedicated thread that owns the connection, so waiting on
+    another worker's lock (up to busy_timeout) never blocks the event loop.
+    """
+
+    def __init__(self, path: str, sweep_interval: float = 60):
+        self.sweep_interval = sweep_interval
+        self._conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("PRAGMA busy_timeout=1000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit "
+            "(key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._next_sweep = time.time() + sweep_interval
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="rate-limit"
+        )
+
+    async def incr_if_allowed(
+        self, key: str, ttl: int, other_key: str, other_weight: float, limit: int
+    ) -> Tuple[bool, int, int]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            self._incr_if_allowed,
+            key,
+            ttl,
+            other_key,
+            other_weight,
+            limit,
+        )
+
+    def _incr_if_allowed(
+        self, key: str, ttl: int, other_key: str, other_weight: float, limit: int
+    ) -> Tuple[bool, int, int]:
+        now = time.time()
+        if now >= self._next_sweep:
+            self._conn.execute("DELETE FROM rate_limit WHERE expires_at <= ?", (now,))
+            self._next_sweep = now + self.sweep_interval
+        params = {
+            "key": key,
+            "other_key": other_key,
+            "now": now,
+            "expires_at": now + ttl,
+            "weight": other_weight,
+            "limit": limit,
+        }
+        # Conditional upsert: returns no row when the hit is over the limit
+        row = self._conn.execute(_CONDITIONAL_INCR, params).fetchone()
+        if row is not None:
+            return True, row[0], row[1]
+        row = self._conn.execute(_COUNTS, params).fetchone()
+        return False, row[0], row[1]
+
+
+class RedisBackend:
+    """
+    Counter store in Redis, shared by every worker that points at the same server.
+    Requires the optional `redis` package.
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package")
+        self._client = redis.from_url(url)
+        self._conditional_incr = self._client.register_script(_REDIS_CONDITIONAL_INCR)
+
+    async def incr_if_allowed(
+        self, key: str, ttl: int, other_key: str, other_weight: float, limit: int
+    ) -> Tuple[bool, int, int]:
+        allowed, current, previous = await self._conditional_incr(
+            keys=[key, other_key], args=[other_weight, limit, ttl]
+        )
+        return bool(allowed), current, previous
+
+
+def create_backend():
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend(settings.RATE_LIMIT_URL or "./rate_limit.db")
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend(settings.RATE_LIMIT_URL or "redis://localhost:6379/0")
+    return MemoryBackend()
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window-counter limiter: O(1) work per request.
+
+    Each key keeps a counter for the current and previous fixed window, and the
+    previous count is weighted by how much of it still overlaps the sliding window.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def hit(
+        self, key: str, max_requests: int, window_seconds: int
+    ) -> Tuple[bool, int]:
+        """
+        Count a request against `key` if it is within the limit; rejected
+        requests are not counted.
+
+        Returns whether it is allowed and, if not, the seconds until it may retry.
+        """
+        now = time.time()
+        window = int(now // window_seconds)
+        elapsed = (now % window_seconds) / window_seconds
+        # One backend round trip: check against both windows, count if allowed
+        allowed, current, previous = await self.backend.incr_if_allowed(
+            f"{key}:{window}",
+            2 * window_seconds,
+            f"{key}:{window - 1}",
+            1 - elapsed,
+            max_requests,
+        )
+        if allowed:
+            return True, 0
+        # When one more request fits: later in this window if there is room
+        # once enough of the previous window has slid out, else in the next
+        # window once enough of this one has
+        if current + 1 <= max_requests:
+            fraction = 1 - (max_requests - current - 1) / previous
+        else:
+            fraction = 1 + max(0, 1 - (max_requests - 1) / max(current, 1))
+        retry_at = (window + fraction) * window_seconds
+        return False, max(1, math.ceil(retry_at - now))
+
+
+def match_route_limit(
+    path: str, route_limits: Dict[str, Tuple[int, int]]
+) -> Optional[Tuple[str, Tuple[int, int]]]:
+    """
+    Return the longest configured path prefix matching `path`, with its limit.
+    """
+    best = None
+    for prefix, limit in route_limits.items():
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best[0])):
+            best = (prefix, limit)
+    return best
@@ -0,0 +1,19 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class ModelResponse(JSONResponse):
+    """
+    JSON response for content that is already validated: pydantic models, or
+    dicts and lists of them.
+
+    pydantic-core serializes it straight to bytes in one pass. Returning a
+    Response makes FastAPI skip its `response_model` round trip (dump to dict,
+    re-validate, jsonable_encoder, json.dumps); the route's `response_model`
+    still documents the schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
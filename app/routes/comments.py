@@ -0,0 +1,226 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.auth import get_current_active_user
+from app.config import settings
+from app.counters import counter_buffer
+from app.database import get_async_session, get_read_session
+from app.models import Comment, Post, User
+from app.models_enums import UserRole
+from app.pagination import paginate, split_page
+from app.queries import comment_depth, delete_comment_tree, select_comment_tree
+from app.responses import ModelResponse
+from app.schemas import CommentCreate, CommentPage, CommentSchema
+
+comment_router = APIRouter(prefix="/comments", tags=["comments"])
+
+
+def build_comment_tree(rows) -> List[CommentSchema]:
+    """
+    Assemble (Comment, depth, username) rows into nested threads in O(n).
+
+    Returns the top-level nodes; replies keep the rows' (chronological) order.
+    """
+    nodes = {}
+    for comment, depth, username in rows:
+        nodes[comment.id] = CommentSchema(
+            id=comment.id,
+            post_id=comment.post_id,
+            user_id=comment.user_id,
+            author_name=username or "Unknown",
+            parent_id=comment.parent_id,
+            content=comment.content,
+            created_at=comment.created_at,
+            likes_count=comment.likes_count,
+            depth=depth,
+        )
+    roots = []
+    for node in nodes.values():
+        if node.depth == 0:
+            roots.append(node)
+        else:
+            nodes[node.parent_id].replies.append(node)
+    return roots
+
+
+async def add_comment(
+    db: AsyncSession,
+    post: Post,
+    user: User,
+    content: str,
+    parent_id=None,
+    depth: int = 0,
+) -> CommentSchema:
+    if not post.allow_comments:
+        raise HTTPException(
+            status_code=403, detail="Comments are disabled for this post"
+        )
+    comment = Comment(
+        post_id=post.id,
+        user_id=user.id,
+        parent_id=parent_id,
+        content=content,
+        created_at=datetime.now(timezone.utc),
+        likes_count=0,
+    )
+    db.add(comment)
+    await db.commit()
+    counter_buffer.incr(Post, "comment_count", post.id)
+    return CommentSchema(
+        id=comment.id,
+        post_id=comment.post_id,
+        user_id=comment.user_id,
+        author_name=user.username,
+        parent_id=comment.parent_id,
+        content=comment.content,
+        created_at=comment.created_at,
+        likes_count=comment.likes_count,
+        depth=depth,
+    )
+
+
+@comment_router.get(
+    "/post/{post_id}", status_code=status.HTTP_200_OK, response_model=CommentPage
+)
+async def list_comments(
+    post_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    max_depth: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    List a post's top-level comments newest first, each with its reply thread.
+
+    The page of top-level comments and every reply under them (down to
+    `max_depth` levels) are fetched in a single recursive query.
+    """
+    roots = paginate(
+        select(Comment.id).where(
+            Comment.post_id == post_id, Comment.parent_id.is_(None)
+        ),
+        Comment,
+        cursor,
+        limit,
+    )
+    rows = (await db.exec(select_comment_tree(Comment.id.in_(roots), max_depth))).all()
+    threads = build_comment_tree(rows)
+    threads.reverse()
+    threads, next_cursor = split_page(threads, limit)
+    return ModelResponse({"items": threads, "next_cursor": next_cursor})
+
+
+@comment_router.post(
+    "/post/{post_id}", response_model=CommentSchema, status_code=status.HTTP_201_CREATED
+)
+async def create_comment(
+    post_id: int,
+    comment_data: CommentCreate,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Add a top-level comment to a post.
+    """
+    post = (await db.exec(select(Post).where(Post.id == post_id))).first()
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return await add_comment(db, post, current_user, comment_data.content)
+
+
+@comment_router.post(
+    "/{comment_id}/replies",
+    response_model=CommentSchema,
+    status_code=status.HTTP_201_CREATED,
+)
+async def reply_to_comment(
+    comment_id: int,
+    comment_data: CommentCreate,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Reply to an existing comment.
+    """
+    row = (
+        await db.exec(
+            select(Comment, Post, comment_depth(comment_id))
+            .join(Post, Comment.post_id == Post.id)
+            .where(Comment.id == comment_id)
+        )
+    ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    parent, post, parent_depth = row
+    return await add_comment(
+        db,
+        post,
+        current_user,
+        comment_data.content,
+        parent_id=parent.id,
+        depth=parent_depth + 1,
+    )
+
+
+@comment_router.get("/{comment_id}/thread", response_model=CommentSchema)
+async def get_comment_thread(
+    comment_id: int,
+    max_depth: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Retrieve a comment and its replies, down to `max_depth` levels, in one query.
+    """
+    rows = (
+        await db.exec(select_comment_tree(Comment.id == comment_id, max_depth))
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    return ModelResponse(build_comment_tree(rows)[0])
+
+
+@comment_router.delete("/{comment_id}", status_code=status.HTTP_200_OK)
+async def delete_comment(
+    comment_id: int,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Delete a comment and all replies beneath it.
+    """
+    comment = (await db.exec(select(Comment).where(Comment.id == comment_id))).first()
+    if not comment:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    if not (current_user.role == UserRole.admin or comment.user_id == current_user.id):
+        raise HTTPException(
+            status_code=403, detail="Not authorized to delete this comment"
+        )
+
+    result = await db.exec(delete_comment_tree(comment_id))
+    await db.commit()
+    counter_buffer.incr(Post, "comment_count", comment.post_id, -result.rowcount)
+    return {"detail": "Comment deleted successfully"}
+
+
+@comment_router.post("/{comment_id}/like", status_code=status.HTTP_202_ACCEPTED)
+async def like_comment(
+    comment_id: int,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Increment a comment's like count.
+
+    The increment is buffered and written within COUNTER_FLUSH_INTERVAL_SECONDS.
+    """
+    exists = (await db.exec(select(Comment.id).where(Comment.id == comment_id))).first()
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    counter_buffer.incr(Comment, "likes_count", comment_id)
+    return {"detail": "Like recorded"}
@@ -1,44 +1,227 @@
 # python
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.auth import get_current_active_user
-from app.database import get_session
-from app.models import Post, User
+from app.bulk import ImportRow, export_ndjson, import_ndjson
+from app.conditional import cache_headers, etag_matches, make_etag, not_modified
+from app.config import settings
+from app.counters import counter_buffer
+from app.database import get_async_session, get_read_session
+from app.feed import FeedKind, feed_ranking
+from app.fieldsets import load_fields, parse_fields, partial_schema
+from app.models import Comment, Post, User
 from app.models_enums import UserRole
-from app.schemas import PostCreate, PostSchema, PostUpdate
+from app.pagination import (
+    decode_rank_cursor,
+    encode_rank_cursor,
+    paginate,
+    split_page,
+)
+from app.queries import (
+    get_post_version,
+    get_post_with_author,
+    post_version,
+    select_posts,
+)
+from app.responses import ModelResponse
+from app.schemas import (
+    ImportReport,
+    PostCreate,
+    PostImport,
+    PostPage,
+    PostSchema,
+    PostSearchPage,
+    PostUpdate,
+)
+from app.search import render_highlight, select_search
 
 post_router = APIRouter(prefix="/posts", tags=["posts"])
 
 
-@post_router.get(
-    "/list_posts", status_code=status.HTTP_200_OK, response_model=List[PostSchema]
-)
+@post_router.get("/list_posts", status_code=status.HTTP_200_OK, response_model=PostPage)
 async def list_posts(
-    db: Session = Depends(get_session),
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    author_id: Optional[int] = None,
+    is_featured: Optional[bool] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_active_user),
 ):
     """
-    List all posts in the database.
+    List posts newest first, one page at a time.
+
+    Pass the returned `next_cursor` back as `cursor` to fetch the following page.
+    `fields` (e.g. `id,title,author_name,created_at`) limits each item to
+    those fields; the others are not even read from the database.
     """
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Not authorized to view posts")
-    posts = db.exec(select(Post)).all()
-    posts_with_author = []
-    for post in posts:
-        post_copy = post.model_dump()
-        post_copy["author_name"] = post.user.username if post.user else "Unknown"
-        posts_with_author.append(post_copy)
-    return posts_with_author
+    fieldset = parse_fields(fields, PostSchema)
+    schema = partial_schema(PostSchema, fieldset)
+    statement = select_posts().options(
+        *load_fields(Post, fieldset, Post.created_at, Post.updated_at)
+    )
+    if author_id is not None:
+        statement = statement.where(Post.author_id == author_id)
+    if is_featured is not None:
+        statement = statement.where(Post.is_featured == is_featured)
+    posts = (await db.exec(paginate(statement, Post, cursor, limit))).all()
+    posts, next_cursor = split_page(posts, limit)
+
+    # Collection validator over the versions of every post on this page
+    etag = make_etag(
+        next_cursor, *(v for post in posts for v in post_version(post)), weak=True
+    )
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    return ModelResponse(
+        {
+            "items": [schema.model_validate(post) for post in posts],
+            "next_cursor": next_cursor,
+        },
+        headers=cache_headers(etag),
+    )
+
+
+@post_router.get("/feed", status_code=status.HTTP_200_OK, response_model=PostPage)
+async def get_feed(
+    kind: FeedKind = "trending",
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Home page feed: `featured` posts, `trending` posts (engagement decayed by
+    age) or the `latest` posts, one page at a time.
+
+    The order comes from a ranking precomputed in the background (see
+    app.feed), so new posts and counts show up within FEED_REFRESH_SECONDS,
+    and each feed holds at most FEED_SIZE posts. `fields` limits each item to
+    those fields, as in /posts/list_posts.
+    """
+    fieldset = parse_fields(fields, PostSchema)
+    schema = partial_schema(PostSchema, fieldset)
+    after = decode_rank_cursor(cursor) if cursor else None
+    ids, next_key = feed_ranking.page(kind, after, limit)
+    posts = {}
+    if ids:
+        statement = (
+            select_posts()
+            .options(*load_fields(Post, fieldset, Post.id))
+            .where(Post.id.in_(ids))
+        )
+        posts = {post.id: post for post in (await db.exec(statement)).all()}
+    return ModelResponse(
+        {
+            # Posts deleted since the last refresh are skipped
+            "items": [schema.model_validate(posts[i]) for i in ids if i in posts],
+            "next_cursor": encode_rank_cursor(*next_key) if next_key else None,
+        }
+    )
+
+
+@post_router.get("/export")
+async def export_posts(current_user: User = Depends(get_current_active_user)):
+    """
+    Stream every post as NDJSON (one JSON object per line), for backups and
+    migrations. Memory use stays flat regardless of the number of posts.
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized to export posts")
+    return StreamingResponse(
+        export_ndjson(Post.__table__), media_type="application/x-ndjson"
+    )
+
+
+async def _check_authors(
+    db: AsyncSession, batch: List[ImportRow], errors: List[dict]
+) -> List[ImportRow]:
+    author_ids = {values["author_id"] for _, values in batch}
+    known = set((await db.exec(select(User.id).where(User.id.in_(author_ids)))).all())
+    rows = []
+    for line_no, values in batch:
+        if values["author_id"] in known:
+            rows.append((line_no, values))
+        else:
+            errors.append(
+                {"line": line_no, "error": f"Unknown author_id {values['author_id']}"}
+            )
+    return rows
+
+
+@post_router.post("/import", response_model=ImportReport)
+async def import_posts(
+    request: Request,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Bulk-insert posts from an NDJSON request body, in the format of /posts/export.
+
+    Rows are inserted in batches; rows that are malformed, reference an unknown
+    author or violate a constraint are reported by line number and skipped.
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized to import posts")
+    return await import_ndjson(
+        db, request.stream(), PostImport, Post.__table__, _check_authors
+    )
+
+
+@post_router.get("/search", response_model=PostSearchPage)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=256),
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_session),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Full-text search over post titles and content, best matches first.
+
+    Matches are highlighted in `title_highlight` and `snippet`, which are
+    HTML-escaped so they can be rendered as is. Pass the
+    returned `next_cursor` back as `cursor` to fetch the following page.
+    """
+    statement = select_search(q, db.bind.dialect.name, cursor, limit)
+    if statement is None:
+        return {"items": [], "next_cursor": None}
+    rows = (await db.exec(statement)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_rank_cursor(rows[-1].rank, rows[-1].Post.id)
+    return ModelResponse(
+        {
+            "items": [
+                {
+                    "post": PostSchema.model_validate(row.Post),
+                    "title_highlight": render_highlight(row.title_highlight),
+                    "snippet": render_highlight(row.snippet),
+                    "rank": row.rank,
+                }
+                for row in rows
+            ],
+            "next_cursor": next_cursor,
+        }
+    )
 
 
 @post_router.post("/", response_model=PostSchema, status_code=status.HTTP_201_CREATED)
 async def create_post(
     post_data: PostCreate,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user=Depends(get_current_active_user),
 ):
     """
@@ -49,6 +232,7 @@ async def create_post(
         title=post_data.title,
         content=post_data.content,
         author_id=current_user.id,
+        user=current_user,
         created_at=created_at,
         updated_at=created_at,
         view_count=post_data.view_count or 0,
@@ -61,43 +245,83 @@ async def create_post(
         likes_count=post_data.likes_count or 0,
     )
     db.add(post)
-    db.commit()
-    db.refresh(post)
-    post_copy = post.model_dump()
-    post_copy["author_name"] = current_user.username
-    return post_copy
+    await db.commit()
+    return ModelResponse(
+        PostSchema.model_validate(post), status_code=status.HTTP_201_CREATED
+    )
 
 
 @post_router.get("/{post_id}", response_model=PostSchema)
 async def get_post(
     post_id: int,
-    db: Session = Depends(get_session),
+    request: Request,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_session),
     current_user=Depends(get_current_active_user),
 ):
     """
     Retrieve a post by ID.
+
+    Every read counts as a view. Supports If-None-Match: a matching ETag is
+    answered with 304 after fetching only the version columns, without loading
+    or serializing the post. The ETag is weak because counters are not part of
+    it; their current values are only sent with a full response. `fields`
+    limits the response to those fields, as in /posts/list_posts.
     """
-    post = db.exec(select(Post).where(Post.id == post_id)).first()
+    fieldset = parse_fields(fields, PostSchema)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        version = await get_post_version(post_id, db)
+        if version is not None:
+            etag = make_etag(*version, weak=True)
+            if etag_matches(if_none_match, etag):
+                counter_buffer.incr(Post, "view_count", post_id)
+                return not_modified(etag, version[1])
+
+    post = await get_post_with_author(
+        post_id, db, *load_fields(Post, fieldset, Post.updated_at)
+    )
 
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    author_name = post.user.username
-    post_copy = post.model_dump()
-    post_copy["author_name"] = author_name
-    return post_copy
+    counter_buffer.incr(Post, "view_count", post_id)
+    return ModelResponse(
+        partial_schema(PostSchema, fieldset).model_validate(post),
+        headers=cache_headers(
+            make_etag(*post_version(post), weak=True), post.updated_at
+        ),
+    )
+
+
+@post_router.post("/{post_id}/like", status_code=status.HTTP_202_ACCEPTED)
+async def like_post(
+    post_id: int,
+    db: AsyncSession = Depends(get_async_session),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Increment a post's like count.
+
+    The increment is buffered and written within COUNTER_FLUSH_INTERVAL_SECONDS.
+    """
+    exists = (await db.exec(select(Post.id).where(Post.id == post_id))).first()
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    counter_buffer.incr(Post, "likes_count", post_id)
+    return {"detail": "Like recorded"}
 
 
 @post_router.put("/{post_id}", response_model=PostSchema)
 async def update_post(
     post_id: int,
     post_data: PostUpdate,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user=Depends(get_current_active_user),
 ):
     """
     Update a post.
     """
-    post = db.exec(select(Post).where(Post.id == post_id)).first()
+    post = await get_post_with_author(post_id, db)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     if not (current_user.role == UserRole.admin or post.author_id == current_user.id):
@@ -123,24 +347,25 @@ async def update_post(
     )
     post.updated_at = datetime.now(timezone.utc)
 
-    db.commit()
-    db.refresh(post)
-    post_copy = post.model_dump()
-    author_name = post.user.username
-    post_copy["author_name"] = author_name
-    return post_copy
+    try:
+        await db.commit()
+    except StaleDataError:
+        # The UPDATE matched no row: deleted since it was read above
+        raise HTTPException(status_code=404, detail="Post not found")
+    feed_ranking.post_changed(post_id)
+    return ModelResponse(PostSchema.model_validate(post))
 
 
 @post_router.delete("/{post_id}", status_code=status.HTTP_200_OK)
 async def delete_post(
     post_id: int,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user=Depends(get_current_active_user),
 ):
     """
     Delete a post.
     """
-    post = db.exec(select(Post).where(Post.id == post_id)).first()
+    post = (await db.exec(select(Post).where(Post.id == post_id))).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     if not (current_user.role == UserRole.admin or post.author_id == current_user.id):
@@ -148,6 +373,10 @@ async def delete_post(
             status_code=403, detail="Not authorized to delete this post"
         )
 
-    db.delete(post)
-    db.commit()
+    await db.exec(delete(Comment).where(Comment.post_id == post_id))
+    # A bulk DELETE: session.delete() would first load post.comments, just
+    # deleted above, to unlink them
+    await db.exec(delete(Post).where(Post.id == post_id))
+    await db.commit()
+    feed_ranking.post_changed(post_id)
     return {"detail": "Post deleted successfully"}
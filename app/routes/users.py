@@ -1,51 +1,153 @@
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm.exc import StaleDataError
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.auth import hash_password, get_current_active_user
-from app.database import get_session
+from app.auth import (
+    hash_password_async,
+    get_current_active_user,
+    invalidate_user,
+    token_cache,
+    user_cache,
+)
+from app.bulk import ImportRow, export_ndjson, import_ndjson
+from app.conditional import cache_headers, etag_matches, make_etag, not_modified
+from app.config import settings
+from app.database import get_async_session, get_read_session
+from app.fieldsets import load_fields, parse_fields, partial_schema
 from app.models import User
 from app.models_enums import UserRole, UserStatus
-from app.schemas import UserCreate, UserSchema, UserUpdate
+from app.pagination import paginate, split_page
+from app.responses import ModelResponse
+from app.schemas import (
+    ImportReport,
+    UserCreate,
+    UserImport,
+    UserPage,
+    UserSchema,
+    UserUpdate,
+)
 
 user_router = APIRouter(prefix="/users", tags=["users"])
 
 
-@user_router.get(
-    "/list_users", status_code=status.HTTP_200_OK, response_model=List[UserSchema]
-)
+@user_router.get("/list_users", status_code=status.HTTP_200_OK, response_model=UserPage)
 async def list_users(
-    db: Session = Depends(get_session),
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_active_user),
 ):
     """
-    List all users in the database.
+    List users newest first, one page at a time.
+
+    Pass the returned `next_cursor` back as `cursor` to fetch the following page.
+    `fields` (e.g. `id,username,created_at`) limits each item to those fields;
+    the others are not even read from the database.
     """
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Not authorized to view users")
-    users = db.exec(select(User)).all()
-    print(users)
-    return users
+    fieldset = parse_fields(fields, UserSchema)
+    schema = partial_schema(UserSchema, fieldset)
+    statement = select(User).options(
+        *load_fields(User, fieldset, User.created_at, User.updated_at)
+    )
+    users = (await db.exec(paginate(statement, User, cursor, limit))).all()
+    users, next_cursor = split_page(users, limit)
+
+    # Collection validator over the versions of every user on this page
+    etag = make_etag(
+        next_cursor, *(v for user in users for v in (user.id, user.updated_at))
+    )
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    return ModelResponse(
+        {
+            "items": [schema.model_validate(user) for user in users],
+            "next_cursor": next_cursor,
+        },
+        headers=cache_headers(etag),
+    )
+
+
+@user_router.get("/cache_stats", status_code=status.HTTP_200_OK)
+async def cache_stats(current_user: User = Depends(get_current_active_user)):
+    """
+    Report hit/miss counters of the authentication caches, for sizing them.
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view stats")
+    return {"user_cache": user_cache.stats(), "token_cache": token_cache.stats()}
+
+
+@user_router.get("/export")
+async def export_users(current_user: User = Depends(get_current_active_user)):
+    """
+    Stream every user as NDJSON (one JSON object per line), for backups and
+    migrations. Password hashes are included so an import restores logins.
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized to export users")
+    return StreamingResponse(
+        export_ndjson(User.__table__), media_type="application/x-ndjson"
+    )
+
+
+async def _hash_passwords(
+    db: AsyncSession, batch: List[ImportRow], errors: List[dict]
+) -> List[ImportRow]:
+    for _, values in batch:
+        password = values.pop("password", None)
+        if password is not None:
+            values["hashed_password"] = await hash_password_async(password)
+    return batch
+
+
+@user_router.post("/import", response_model=ImportReport)
+async def import_users(
+    request: Request,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Bulk-insert users from an NDJSON request body, in the format of /users/export.
+
+    Each row needs either `hashed_password` or a plain `password` (hashed on
+    import, which is far slower). Malformed rows and duplicate usernames or
+    emails are reported by line number and skipped.
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized to import users")
+    return await import_ndjson(
+        db, request.stream(), UserImport, User.__table__, _hash_passwords
+    )
 
 
 @user_router.post("/", response_model=UserSchema, status_code=201)
-async def create_user(user_dict: UserCreate, db: Session = Depends(get_session)):
+async def create_user(
+    user_dict: UserCreate, db: AsyncSession = Depends(get_async_session)
+):
     """
     Create a new user in the database.
     """
-    existing_user = db.exec(
-        select(User).where(User.username == user_dict.username)
+    existing_user = (
+        await db.exec(select(User).where(User.username == user_dict.username))
     ).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
-    hashed_password = hash_password(user_dict.password)
     # Check if the email already exists
-    existing_email = db.exec(select(User).where(User.email == user_dict.email)).first()
+    existing_email = (
+        await db.exec(select(User).where(User.email == user_dict.email))
+    ).first()
     if existing_email:
         raise HTTPException(status_code=400, detail="Email already exists")
+    hashed_password = await hash_password_async(user_dict.password)
     created_at = datetime.now(timezone.utc)
     updated_at = datetime.now(timezone.utc)
     user = User(
@@ -62,43 +164,65 @@ async def create_user(user_dict: UserCreate, db: Session = Depends(get_session))
         status=UserStatus(user_dict.status),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @user_router.get("/{user_id}", response_model=UserSchema)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_session),
+    request: Request,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_active_user),
 ):
     """
     Get a user by ID.
+
+    Supports If-None-Match: a matching ETag is answered with 304 after fetching
+    only `updated_at`, without loading or serializing the user. `fields` limits
+    the response to those fields, as in /users/list_users.
     """
-    user = db.exec(select(User).where(User.id == user_id)).first()
+    fieldset = parse_fields(fields, UserSchema)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        version = (
+            await db.exec(select(User.id, User.updated_at).where(User.id == user_id))
+        ).first()
+        if version is not None:
+            etag = make_etag(*version)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, version.updated_at)
+
+    statement = select(User).options(*load_fields(User, fieldset, User.updated_at))
+    user = (await db.exec(statement.where(User.id == user_id))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return ModelResponse(
+        partial_schema(UserSchema, fieldset).model_validate(user),
+        headers=cache_headers(make_etag(user.id, user.updated_at), user.updated_at),
+    )
 
 
 @user_router.put("/{user_id}", response_model=UserSchema)
 async def update_user(
     user_id: int,
     user_dict: UserUpdate,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user),
 ):
     """
     Update a user's information.
     """
-    user = db.exec(select(User).where(User.id == user_id)).first()
+    user = (await db.exec(select(User).where(User.id == user_id))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if user.username != current_user.username:
         raise HTTPException(
             status_code=403, detail="Not authorized to update this user"
         )
+    old_username = user.username
 
     user.username = user_dict.username if user_dict.username else user.username
     user.email = user_dict.email if user_dict.email else user.email
@@ -111,21 +235,25 @@ async def update_user(
         else user.profile_picture
     )
     user.role = UserRole(user_dict.role) if user_dict.role else user.role
-    db.commit()
-    db.refresh(user)
+    user.updated_at = datetime.now(timezone.utc)
+    try:
+        await db.commit()
+    except StaleDataError:
+        # The UPDATE matched no row: deleted since it was read above
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(old_username, user.username)
+    await db.refresh(user)
     return user
 
 
 @user_router.delete("/{user_id}", status_code=status.HTTP_200_OK)
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user),
 ):
     # Retrieve the user from the database.
-    user = db.exec(select(User).where(User.id == user_id)).first()
-    print("user", user)
-    print("current_user", current_user)
+    user = (await db.exec(select(User).where(User.id == user_id))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     # Verify that the current user has the necessary rights.
@@ -137,6 +265,7 @@ async def delete_user(
         )
 
     # Delete the user and commit the change.
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    invalidate_user(user.username)
     return {"detail": "User deleted successfully"}
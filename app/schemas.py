@@ -1,10 +1,25 @@
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Annotated, List, Optional
 
-from pydantic import BaseModel
+from pydantic import AfterValidator, BaseModel, Field, model_validator
 
 from app.models_enums import UserRole, UserStatus
 
+# Integer that fits an INTEGER column on every backend (32-bit on PostgreSQL);
+# imports reject larger values up front instead of failing in the driver
+DbInt = Annotated[int, Field(ge=-(2**31), le=2**31 - 1)]
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# Timestamps are stored as naive UTC; values just assigned in a handler are
+# aware, so normalize them to serialize the same as after a reload
+UtcDatetime = Annotated[datetime, AfterValidator(_naive_utc)]
+
 
 class Token(BaseModel):
     access_token: str
@@ -24,18 +39,36 @@ class UserSchema(BaseModel):
     bio: Optional[str] = None
     profile_picture: Optional[str] = None
     role: UserRole
-    created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
+    created_at: Optional[UtcDatetime] = None
+    updated_at: Optional[UtcDatetime] = None
     status: UserStatus
 
     class Config:
         from_attributes = True
 
 
+class UserPage(BaseModel):
+    items: List[UserSchema]
+    next_cursor: Optional[str] = None
+
+
 class UserCreate(UserSchema):
     password: str
 
 
+class UserImport(UserSchema):
+    id: Optional[DbInt] = None
+    # Either an existing hash (as exported) or a plain password to hash
+    hashed_password: Optional[str] = None
+    password: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_credentials(self):
+        if self.hashed_password is None and self.password is None:
+            raise ValueError("Either hashed_password or password is required")
+        return self
+
+
 class UserUpdate(BaseModel):
     username: str = None
     email: str = None
@@ -64,17 +97,51 @@ class PostSchema(BaseModel):
     content: str
     author_id: int
     author_name: str
-    created_at: datetime
-    updated_at: datetime
+    created_at: UtcDatetime
+    updated_at: UtcDatetime
     view_count: int
     is_featured: bool
     allow_comments: bool
     likes_count: int
+    comment_count: int
 
     class Config:
         from_attributes = True
 
 
+class PostPage(BaseModel):
+    items: List[PostSchema]
+    next_cursor: Optional[str] = None
+
+
+class PostImport(BaseModel):
+    id: Optional[DbInt] = None
+    title: str
+    content: str
+    author_id: DbInt
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    view_count: DbInt = 0
+    is_featured: bool = False
+    allow_comments: bool = True
+    likes_count: DbInt = 0
+    comment_count: DbInt = 0
+
+
+class PostSearchHit(BaseModel):
+    post: PostSchema
+    # HTML: title and content excerpt, escaped, with matches wrapped in
+    # <mark>...</mark>
+    title_highlight: str
+    snippet: str
+    rank: float
+
+
+class PostSearchPage(BaseModel):
+    items: List[PostSearchHit]
+    next_cursor: Optional[str] = None
+
+
 class PostUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
@@ -82,3 +149,37 @@ class PostUpdate(BaseModel):
     is_featured: Optional[bool] = None
     allow_comments: Optional[bool] = None
     likes_count: Optional[int] = None
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    inserted: int
+    errors: List[ImportRowError]
+
+
+class CommentCreate(BaseModel):
+    content: str
+
+
+class CommentSchema(BaseModel):
+    id: int
+    post_id: int
+    user_id: int
+    author_name: str
+    parent_id: Optional[int] = None
+    content: str
+    created_at: UtcDatetime
+    likes_count: int
+    # Levels below the post's top-level comments; in /comments/{id}/thread,
+    # below the requested comment
+    depth: int
+    replies: List["CommentSchema"] = []
+
+
+class CommentPage(BaseModel):
+    items: List[CommentSchema]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,159 @@
+import html
+import re
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Float, column, func, literal_column, table, text, tuple_
+
+from app.models import Post
+from app.pagination import decode_rank_cursor
+from app.queries import select_posts
+
+# The database marks matches with these control characters; render_highlight
+# replaces them with <mark> tags once the post text around them is escaped
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+# SQLite: an external-content FTS5 table over post(title, content), kept in
+# sync by triggers so every write path (routes, imports, bulk loads) is covered.
+# The UPDATE trigger only fires for title/content, not for counter flushes.
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(
+        title, content, content='post', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN
+        INSERT INTO post_fts(rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE OF title, content
+    ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO post_fts(rowid, title, content)
+        VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+# PostgreSQL: a stored generated tsvector (title weighted above content) with a
+# GIN index; it is computed on write and backfilled when the column is added.
+_POSTGRES_DDL = [
+    """
+    ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_post_search_vector ON post USING GIN (search_vector)",
+]
+
+
+def create_search_index(conn) -> None:
+    """
+    Create the full-text index for posts if it does not exist yet.
+    """
+    if conn.dialect.name == "sqlite":
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'post_fts'")
+        ).first()
+        for statement in _SQLITE_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            # Index the posts written before the table existed
+            conn.execute(text("INSERT INTO post_fts(post_fts) VALUES ('rebuild')"))
+    elif conn.dialect.name == "postgresql":
+        for statement in _POSTGRES_DDL:
+            conn.execute(text(statement))
+
+
+def drop_search_index(conn) -> None:
+    """
+    Drop the SQLite FTS5 table and its triggers, e.g. before a bulk load;
+    create_search_index then rebuilds it in one pass. The PostgreSQL column is
+    computed per row and left in place.
+    """
+    if conn.dialect.name == "sqlite":
+        for trigger in ("post_fts_insert", "post_fts_delete", "post_fts_update"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text("DROP TABLE IF EXISTS post_fts"))
+
+
+def to_match_query(q: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query matching every word, so user input can
+    never be parsed as FTS5 syntax. Returns None if `q` contains no words.
+    """
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"' for term in terms) or None
+
+
+def render_highlight(text: str) -> str:
+    """
+    HTML-escape a highlighted title or snippet from select_search and wrap its
+    matches in <mark>...</mark>.
+    """
+    return (
+        html.escape(text).replace(_MATCH_START, "<mark>").replace(_MATCH_END, "</mark>")
+    )
+
+
+def select_search(q: str, dialect: str, cursor: Optional[str], limit: int):
+    """
+    Select one page of (Post, rank, title_highlight, snippet) rows matching `q`,
+    best match first, with one look-ahead row as in paginate().
+
+    `rank` is lower for better matches on every backend, so pages are keyed on
+    (rank, id) ascending. Returns None if `q` cannot match anything.
+    """
+    if dialect == "sqlite":
+        match = to_match_query(q)
+        if match is None:
+            return None
+        fts = table("post_fts", column("rowid"))
+        fts_ref = literal_column("post_fts")
+        rank = func.bm25(fts_ref, 10.0, 1.0)
+        title = func.highlight(fts_ref, 0, _MATCH_START, _MATCH_END)
+        snippet = func.snippet(fts_ref, 1, _MATCH_START, _MATCH_END, "…", 32)
+        join = (fts, fts.c.rowid == Post.id)
+        condition = fts_ref.op("MATCH")(match)
+    elif dialect == "postgresql":
+        query = func.websearch_to_tsquery("english", q)
+        vector = literal_column("post.search_vector")
+        markers = f"StartSel={_MATCH_START}, StopSel={_MATCH_END}"
+        rank = -func.ts_rank_cd(vector, query, type_=Float)
+        title = func.ts_headline(
+            "english", Post.title, query, f"{markers}, HighlightAll=true"
+        )
+        snippet = func.ts_headline(
+            "english", Post.content, query, f"{markers}, MaxWords=35, MinWords=15"
+        )
+        join = None
+        condition = vector.op("@@")(query)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"Full-text search is not supported on {dialect}",
+        )
+
+    statement = select_posts(
+        rank.label("rank"), title.label("title_highlight"), snippet.label("snippet")
+    )
+    if join is not None:
+        statement = statement.join(*join)
+    statement = statement.where(condition)
+    if cursor:
+        statement = statement.where(tuple_(rank, Post.id) > decode_rank_cursor(cursor))
+    return statement.order_by(rank, Post.id).limit(limit + 1)
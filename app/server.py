@@ -0,0 +1,111 @@
+"""
+Run the API with uvicorn in production: several worker processes on uvloop and
+httptools, drained gracefully on SIGTERM and recycled after a number of
+requests. Everything is configured through app.config.Settings (and so the
+environment), e.g.:
+
+    WORKERS=4 MAX_REQUESTS=10000 python -m app.server
+"""
+
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count() -> int:
+    """
+    WORKERS if set, else one worker per CPU this process may run on (which
+    honours CPU affinity, unlike os.cpu_count()).
+    """
+    if settings.WORKERS > 0:
+        return settings.WORKERS
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS or Windows
+        return os.cpu_count() or 1
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn server that, on the first SIGTERM/SIGINT, reports not ready on
+    /readyz but keeps serving for SHUTDOWN_DRAIN_SECONDS, so load balancers
+    stop routing to it before its listener closes. uvicorn's graceful shutdown
+    then waits for in-flight requests. A second signal exits at once.
+    """
+
+    drain_deadline: Optional[float] = None
+
+    def run(self, sockets=None) -> None:
+        # Runs in each worker: spread recycling so workers do not restart together
+        if self.config.limit_max_requests and settings.MAX_REQUESTS_JITTER:
+            self.config.limit_max_requests += random.randint(
+                0, settings.MAX_REQUESTS_JITTER
+            )
+        super().run(sockets=sockets)
+
+    def handle_exit(self, sig, frame) -> None:
+        if self.drain_deadline is not None or settings.SHUTDOWN_DRAIN_SECONDS <= 0:
+            return super().handle_exit(sig, frame)
+        from app.warmup import readiness
+
+        logger.info("Draining for %ss before shutdown", settings.SHUTDOWN_DRAIN_SECONDS)
+        readiness.ready = False
+        self.drain_deadline = time.monotonic() + settings.SHUTDOWN_DRAIN_SECONDS
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.drain_deadline is not None and time.monotonic() >= self.drain_deadline:
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+def main():
+    workers = worker_count()
+    # A supervisor process is needed to run several workers or to replace
+    # recycled ones
+    supervised = workers > 1 or settings.MAX_REQUESTS > 0
+    # Import the app up front so a broken build fails here, once, instead of in
+    # every worker; without a supervisor this instance is the one served
+    from app.main import app
+
+    if supervised and settings.CREATE_TABLES_ON_STARTUP:
+        from app.database import create_db_and_tables
+
+        # Once here rather than racing in every worker's lifespan
+        create_db_and_tables()
+        os.environ["CREATE_TABLES_ON_STARTUP"] = "False"
+
+    config = uvicorn.Config(
+        "app.main:app" if supervised else app,
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=workers,
+        loop=settings.SERVER_LOOP,
+        http=settings.SERVER_HTTP,
+        limit_max_requests=settings.MAX_REQUESTS or None,
+        timeout_graceful_shutdown=settings.GRACEFUL_TIMEOUT_SECONDS,
+        # LoggingMiddleware writes the access log, and uvicorn's own loggers
+        # propagate to the queue handler of app.logging_config instead of
+        # getting their own blocking stdout handlers
+        access_log=False,
+        log_config=None,
+    )
+    server = DrainingServer(config)
+    if supervised:
+        logger.info("Starting %d workers", workers)
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
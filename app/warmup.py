@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.auth import hash_password_async
+from app.config import settings
+from app.database import async_engine, replicas, write_engine
+from app.feed import feed_ranking
+from app.models import Comment, Post, User, get_user_async
+from app.pagination import paginate
+from app.queries import (
+    get_post_version,
+    get_post_with_author,
+    select_comment_tree,
+    select_posts,
+)
+
+logger = logging.getLogger(__name__)
+
+# Delay between attempts when warm-up fails (e.g. the database is still down)
+RETRY_SECONDS = 5
+
+
+async def _open_pool(engine: AsyncEngine) -> None:
+    """
+    Check out `pool_size` connections at once, so each one is actually opened.
+    """
+
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(engine.pool.size())))
+
+
+async def _prime_statements(engine: AsyncEngine) -> None:
+    """
+    Run the hot read queries once, with keys that match nothing, so their
+    compiled forms are in `engine`'s statement cache before the first request.
+    """
+    async with AsyncSession(engine) as session:
+        await get_user_async("", session)
+        await get_post_version(0, session)
+        await get_post_with_author(0, session)
+        await session.exec(paginate(select_posts(), Post, None, 1))
+        await session.exec(paginate(select(User), User, None, 1))
+        await session.exec(select_comment_tree(Comment.id == 0))
+
+
+async def warm_up() -> None:
+    """
+    Open the connection pools, prime the statement caches of the read engines,
+    load the bcrypt backend in the hashing pool and wait for the first feed
+    ranking.
+    """
+    await _open_pool(async_engine)
+    if write_engine is not async_engine:
+        await _open_pool(write_engine)
+    for engine in (async_engine, *replicas.engines):
+        try:
+            await _prime_statements(engine)
+        except Exception:
+            if engine is async_engine:
+                raise
+            # A failing replica is ejected on use; it must not hold up startup
+            logger.warning("Could not warm up a read replica", exc_info=True)
+    await hash_password_async("warm-up")
+    await feed_ranking.built.wait()
+
+
+class Readiness:
+    """
+    Whether this process should receive traffic: false until warm-up has
+    finished (retrying until it succeeds) and again once shutdown begins.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        while True:
+            try:
+                await warm_up()
+                break
+            except Exception:
+                logger.exception("Warm-up failed, retrying in %ss", RETRY_SECONDS)
+                await asyncio.sleep(RETRY_SECONDS)
+        logger.info("Warm-up finished in %.2fs", loop.time() - start)
+        self.ready = True
+
+    def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+        else:
+            self.ready = True
+
+    async def stop(self) -> None:
+        self.ready = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+readiness = Readiness(settings.WARMUP_ON_STARTUP)
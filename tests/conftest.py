@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+import pytest
+
+# Settings are read on import, so configure a throwaway database first
+_tmp_dir = tempfile.mkdtemp()
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_tmp_dir}/test.db",
+    ECHO="False",
+    LOG_LEVEL="WARNING",
+    DB_STATS_HEADERS="True",
+    BCRYPT_ROUNDS="4",
+    RATE_LIMIT_MAX_REQUESTS="1000000",
+    WARMUP_ON_STARTUP="False",
+)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+def user_data(username: str, role: str = "author") -> dict:
+    return {
+        "username": username,
+        "password": "pw",
+        "email": f"{username}@example.com",
+        "first_name": "Test",
+        "last_name": "User",
+        "role": role,
+        "status": "active",
+    }
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def login(client):
+    def login(username: str, role: str = "author") -> dict:
+        client.post("/users/", json=user_data(username, role))
+        response = client.post("/token", data={"username": username, "password": "pw"})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return login
@@ -0,0 +1,32 @@
+"""
+Depth reported for replies, when created and when listed under the post.
+"""
+
+
+def test_reply_depth(client, login):
+    headers = login("comment_author")
+    response = client.post(
+        "/posts/", json={"title": "t", "content": "c"}, headers=headers
+    )
+    post_id = response.json()["id"]
+
+    comment_id = client.post(
+        f"/comments/post/{post_id}", json={"content": "c"}, headers=headers
+    ).json()["id"]
+    created = []
+    for _ in range(2):
+        reply = client.post(
+            f"/comments/{comment_id}/replies", json={"content": "r"}, headers=headers
+        ).json()
+        created.append(reply)
+        comment_id = reply["id"]
+    assert [reply["depth"] for reply in created] == [1, 2]
+
+    listed = []
+    node = client.get(f"/comments/post/{post_id}", headers=headers).json()["items"][0]
+    while node["replies"]:
+        node = node["replies"][0]
+        listed.append(node)
+    assert [(n["id"], n["depth"]) for n in listed] == [
+        (r["id"], r["depth"]) for r in created
+    ]
@@ -0,0 +1,87 @@
+"""
+Statement counts of the posts endpoints, from the X-DB-Queries header, so an
+N+1 (e.g. a lazy load of each post's author) fails here instead of in
+production.
+
+Writes go through the serialized SQLite writer, which counts its
+BEGIN IMMEDIATE as a statement.
+"""
+
+import pytest
+
+
+def queries(response) -> int:
+    assert response.status_code < 400, response.text
+    return int(response.headers["X-DB-Queries"])
+
+
+def create_post(client, headers) -> int:
+    response = client.post(
+        "/posts/", json={"title": "t", "content": "c"}, headers=headers
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+@pytest.fixture(scope="module")
+def admin(login):
+    return login("query_admin", "admin")
+
+
+@pytest.fixture(scope="module")
+def authors(client, login):
+    """
+    Headers of five authors with three posts each. Creating the posts caches
+    each author's user, so authentication adds no query to later requests.
+    """
+    authors = [login(f"query_author{i}") for i in range(5)]
+    for headers in authors:
+        for _ in range(3):
+            create_post(client, headers)
+    return authors
+
+
+def test_list_posts(client, admin, authors):
+    client.get("/posts/list_posts", headers=admin)
+    one_author = client.get("/posts/list_posts?limit=1", headers=admin)
+    many_authors = client.get("/posts/list_posts?limit=15", headers=admin)
+    names = {post["author_name"] for post in many_authors.json()["items"]}
+    assert names == {f"query_author{i}" for i in range(5)}
+    assert queries(one_author) == queries(many_authors) == 1
+
+
+def test_feed(client, admin, authors):
+    response = client.get("/posts/feed?kind=latest&limit=15", headers=admin)
+    # At most the one query for the posts on the page: the ranking is built
+    # in the background and may not include them yet
+    assert queries(response) <= 1
+
+
+def test_get_post(client, authors):
+    post_id = create_post(client, authors[0])
+    response = client.get(f"/posts/{post_id}", headers=authors[1])
+    assert response.json()["author_name"] == "query_author0"
+    assert queries(response) == 1
+
+
+def test_create_post(client, authors):
+    response = client.post(
+        "/posts/", json={"title": "t", "content": "c"}, headers=authors[2]
+    )
+    # BEGIN, INSERT
+    assert queries(response) == 2
+
+
+def test_update_post(client, authors):
+    post_id = create_post(client, authors[3])
+    response = client.put(f"/posts/{post_id}", json={"title": "u"}, headers=authors[3])
+    assert response.json()["author_name"] == "query_author3"
+    # SELECT post with author, BEGIN, UPDATE
+    assert queries(response) == 3
+
+
+def test_delete_post(client, authors):
+    post_id = create_post(client, authors[4])
+    response = client.delete(f"/posts/{post_id}", headers=authors[4])
+    # SELECT post, BEGIN, DELETE comments, DELETE post
+    assert queries(response) == 4
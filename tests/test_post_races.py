@@ -0,0 +1,28 @@
+"""
+Writes to a post deleted by a concurrent request after the handler read it.
+"""
+
+import os
+import sqlite3
+
+import app.routes.posts as post_routes
+
+
+def test_update_deleted_post(client, login, monkeypatch):
+    headers = login("race_author")
+    response = client.post(
+        "/posts/", json={"title": "t", "content": "c"}, headers=headers
+    )
+    post_id = response.json()["id"]
+    read_post = post_routes.get_post_with_author
+
+    async def read_then_delete(post_id, session, *options):
+        post = await read_post(post_id, session, *options)
+        database = os.environ["DATABASE_URL"].removeprefix("sqlite:///")
+        with sqlite3.connect(database) as conn:
+            conn.execute("DELETE FROM post WHERE id = ?", (post_id,))
+        return post
+
+    monkeypatch.setattr(post_routes, "get_post_with_author", read_then_delete)
+    response = client.put(f"/posts/{post_id}", json={"title": "u"}, headers=headers)
+    assert response.status_code == 404
@@ -0,0 +1,19 @@
+"""
+Timestamps serialize the same in write responses as when read back.
+"""
+
+
+def test_write_and_read_timestamps_match(client, login):
+    headers = login("timestamp_author")
+    created = client.post(
+        "/posts/", json={"title": "t", "content": "c"}, headers=headers
+    ).json()
+    read = client.get(f"/posts/{created['id']}", headers=headers).json()
+    assert created["created_at"] == read["created_at"]
+    assert created["updated_at"] == read["updated_at"]
+
+    updated = client.put(
+        f"/posts/{created['id']}", json={"title": "u"}, headers=headers
+    ).json()
+    read = client.get(f"/posts/{created['id']}", headers=headers).json()
+    assert updated["updated_at"] == read["updated_at"]